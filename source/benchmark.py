@@ -0,0 +1,423 @@
+import os
+import sys
+import io
+import math
+import time
+import random
+import json
+import shutil
+import argparse
+import tempfile
+
+import PIL.Image
+import PIL.ImageChops
+import PIL.ImageStat
+import PIL.PngImagePlugin
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESOLUTIONS = [(512, 512), (768, 1152), (1024, 1024), (2048, 2048), (4096, 2304)]
+
+def make_image(width, height, seed):
+    rng = random.Random(seed)
+    gradient = PIL.Image.linear_gradient("L").resize((width, height))
+    radial = PIL.Image.radial_gradient("L").resize((width, height))
+    noise = PIL.Image.effect_noise((width, height), rng.randint(16, 64))
+    fractal = PIL.Image.effect_mandelbrot((width, height), (-2.0 + rng.random(), -1.0, 1.0, 1.0 + rng.random()), 64)
+    return PIL.Image.merge("RGB", (PIL.Image.blend(gradient, noise, 0.3), radial, fractal))
+
+def make_parameters(w, h, seed):
+    return f"a photo of a cat, masterpiece, <lora:style:0.8>\nNegative prompt: blurry\nSteps: 25, Sampler: Euler a, CFG scale: 7, Seed: {seed}, Size: {w}x{h}, Model: model"
+
+def make_folder(folder, count, formats=["png", "jpg"]):
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for i in range(count):
+        w, h = RESOLUTIONS[i % len(RESOLUTIONS)]
+        ext = formats[i % len(formats)]
+        file = os.path.join(folder, f"{i:07d}.{ext}")
+        if not os.path.exists(file):
+            image = make_image(w, h, i)
+            if ext == "png":
+                info = PIL.PngImagePlugin.PngInfo()
+                info.add_text("parameters", make_parameters(w, h, i))
+                image.save(file, pnginfo=info)
+            else:
+                image.save(file)
+        files += [file]
+    return files
+
+def peak_rss():
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+def summarize(times, elapsed):
+    return {
+        "count": len(times),
+        "throughput": len(times) / elapsed if elapsed else 0,
+        "p50_ms": percentile(times, 50) * 1000,
+        "p95_ms": percentile(times, 95) * 1000,
+        "p99_ms": percentile(times, 99) * 1000
+    }
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values)-1, int(len(values) * p / 100))]
+
+def mse(a, b):
+    diff = PIL.ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    return sum(r*r for r in PIL.ImageStat.Stat(diff).rms) / 3
+
+def psnr(errors):
+    error = sum(errors) / len(errors)
+    if error == 0:
+        return float("inf")
+    return 10 * math.log10(255 * 255 / error)
+
+def benchmark_decode(args):
+    import thumbnails
+
+    folder = args.folder or os.path.join(tempfile.gettempdir(), "qdiffusion-benchmark")
+    files = make_folder(folder, args.count, args.formats)
+    size = (args.size, args.size)
+
+    modes = ["quality"] + list(thumbnails.THUMBNAIL_MODES.keys())
+    reference = {}
+    results = {}
+    for mode in modes:
+        times = []
+        errors = []
+        for file in files:
+            start = time.perf_counter()
+            blob = thumbnails.get_thumbnail(file, size, 100, mode)
+            times += [time.perf_counter() - start]
+            image = PIL.Image.open(io.BytesIO(blob))
+            if mode == "quality":
+                reference[file] = image
+            elif image.size == reference[file].size:
+                errors += [mse(image, reference[file])]
+        results[mode] = {
+            "mean_ms": sum(times) / len(times) * 1000,
+            "p95_ms": percentile(times, 95) * 1000,
+            "psnr_db": psnr(errors) if errors else None
+        }
+
+    baseline = results["quality"]["mean_ms"]
+    print(f"{len(files)} files, {size[0]}x{size[1]}")
+    for mode, r in results.items():
+        psnr_text = "-" if r["psnr_db"] == None else f"{r['psnr_db']:.1f}dB"
+        print(f"{mode:>10} {r['mean_ms']:8.2f}ms mean {r['p95_ms']:8.2f}ms p95 {baseline/r['mean_ms']:5.2f}x {psnr_text:>8}")
+
+def benchmark_thumbnails(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QSize
+    from PyQt5.QtWidgets import QApplication
+    import thumbnails
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+
+    folder = args.folder or os.path.join(tempfile.gettempdir(), "qdiffusion-benchmark-thumbnails")
+    files = make_folder(folder, args.count, ["png"])
+    work = tempfile.mkdtemp()
+
+    def make_storage(name):
+        store = os.path.join(work, name + ".db") if args.store else ""
+        return thumbnails.ThumbnailStorage((256,256), (640,640), 75, store, {}, args.workers, args.mode)
+
+    def run_sync(storage):
+        times = []
+        start = time.perf_counter()
+        for file in files:
+            t = time.perf_counter()
+            storage.sync_provider.requestImage(file, QSize())
+            times += [time.perf_counter() - t]
+        return times, time.perf_counter() - start
+
+    def run_async(storage, provider):
+        times = {}
+        start = time.perf_counter()
+        responses = []
+        for file in files:
+            t = time.perf_counter()
+            response = provider.requestImageResponse(file, QSize())
+            if response.done:
+                times[file] = time.perf_counter() - t
+            else:
+                response.finished.connect(lambda file=file, t=t: times.__setitem__(file, time.perf_counter() - t))
+            responses += [response]
+        while len(times) < len(files):
+            app.processEvents()
+            time.sleep(0.0005)
+        return list(times.values()), time.perf_counter() - start
+
+    def run(storage, kind, size):
+        provider = storage.big_provider if kind == "big" else storage.async_provider
+        stats = storage.cache[size].stats()
+        before = current_rss()
+        times, elapsed = run_sync(storage) if kind == "sync" else run_async(storage, provider)
+        after = current_rss()
+        result = summarize(times, elapsed)
+        hits = storage.cache[size].stats()["hits"] - stats["hits"]
+        misses = storage.cache[size].stats()["misses"] - stats["misses"]
+        result["hit_ratio"] = hits / (hits + misses) if hits + misses else 0
+        result["requests"] = hits + misses
+        result["rss_delta"] = after - before if before and after else None
+        return result
+
+    results = {"count": len(files), "workers": args.workers, "mode": args.mode, "store": args.store, "scenarios": {}}
+    scenarios = [
+        ("sync", "sync", (256,256)),
+        ("async", "async", (256,256)),
+        ("big", "big", (640,640))
+    ]
+    for name, kind, size in scenarios:
+        storage = make_storage(name)
+        for phase in ["cold", "warm"]:
+            results["scenarios"][f"{name}_{phase}"] = run(storage, kind, size)
+        if args.store:
+            results["scenarios"][f"{name}_persistent"] = run(make_storage(name), kind, size)
+    results["peak_rss"] = peak_rss()
+
+    shutil.rmtree(work, ignore_errors=True)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+def make_metadata_folder(folder, count):
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for i in range(count):
+        w, h = RESOLUTIONS[i % len(RESOLUTIONS)]
+        file = os.path.join(folder, f"{i:07d}.png")
+        if not os.path.exists(file):
+            info = PIL.PngImagePlugin.PngInfo()
+            if i % 3 == 1:
+                info.add_itxt("parameters", make_parameters(w, h, i), zip=True)
+            else:
+                info.add_text("parameters", make_parameters(w, h, i))
+            PIL.Image.effect_noise((w//8, h//8), 32).resize((w, h)).save(file, pnginfo=info, compress_level=1)
+        files += [file]
+    return files
+
+def benchmark_metadata(args):
+    import parameters
+
+    folder = args.folder or os.path.join(tempfile.gettempdir(), "qdiffusion-benchmark-metadata")
+    files = make_metadata_folder(folder, args.count)
+
+    def read_pil(file):
+        with PIL.Image.open(file) as img:
+            return img.size[0], img.size[1], img.info.get("parameters", "")
+
+    def read_header(file):
+        w, h, text = parameters.getImageHeader(file)
+        return w, h, text.get("parameters", "")
+
+    for file in files:
+        with open(file, "rb") as f:
+            f.read()
+
+    results = {}
+    outputs = {}
+    for name, reader in [("pil", read_pil), ("header", read_header)]:
+        times = []
+        outputs[name] = []
+        start = time.perf_counter()
+        for file in files:
+            t = time.perf_counter()
+            outputs[name] += [reader(file)]
+            times += [time.perf_counter() - t]
+        results[name] = summarize(times, time.perf_counter() - start)
+
+    mismatched = sum(1 for a, b in zip(outputs["pil"], outputs["header"]) if a != b)
+    print(f"{len(files)} files, {mismatched} mismatched")
+    for name, r in results.items():
+        print(f"{name:>8} {r['throughput']:10.1f} files/s {r['p50_ms']:8.3f}ms p50 {r['p99_ms']:8.3f}ms p99 {r['throughput']/results['pil']['throughput']:5.2f}x")
+
+def benchmark_diff(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    import sql
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    database = sql.Database(app)
+
+    def make_rows(rows):
+        return sql.Rows(["file", "width", "height", "idx"], list(rows))
+
+    results = {}
+    for count in args.counts:
+        base = [(f"{i:07d}.png", 512, 768, i) for i in range(count)]
+        extra = ("new.png", 512, 768, count)
+        scenarios = {
+            "append": base + [extra],
+            "prepend": [extra] + base,
+            "delete-one": base[:count//2] + base[count//2+1:],
+            "reorder": base[-1:] + base[:-1]
+        }
+        for key in args.keys:
+            model = sql.Sql(None)
+            model.keyColumn = "" if key == "record" else key
+            signals = []
+            model.rowsInserted.connect(lambda p, a, b: signals.append(b - a + 1))
+            model.rowsRemoved.connect(lambda p, a, b: signals.append(b - a + 1))
+            model.dataChanged.connect(lambda a, b: signals.append(b.row() - a.row() + 1))
+            for name, new in scenarios.items():
+                model.updateResults(make_rows(base))
+                signals.clear()
+                new = make_rows(new)
+                start = time.perf_counter()
+                model.updateResults(new)
+                elapsed = time.perf_counter() - start
+                results[f"{count} {key} {name}"] = {"ms": elapsed * 1000, "signals": len(signals), "rows": sum(signals)}
+                model.reset()
+
+    for name, r in results.items():
+        print(f"{name:>28} {r['ms']:10.2f}ms {r['signals']:3d} signals {r['rows']:3d} rows")
+
+    database.stop()
+
+def benchmark_rows(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import gc
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtSql import QSqlQuery
+    import sql
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    database = sql.Database(app)
+    conn = sql.Connection(app)
+    conn.connect()
+
+    columns = ["file TEXT", "folder TEXT", "width INTEGER", "height INTEGER", "idx INTEGER", "model TEXT", "sampler TEXT", "seed INTEGER", "steps INTEGER", "scale REAL", "mtime REAL"]
+    conn.doQuery(f"CREATE TABLE rows({', '.join(columns)});")
+    q = QSqlQuery(conn.db)
+    q.prepare(f"INSERT INTO rows VALUES ({', '.join(['?'] * len(columns))});")
+    for values in zip(*[(f"/outputs/txt2img/{i:07d}.png", "txt2img", 512, 768, i, "model", "Euler a", 1000 + i, 25, 7.0, 1.7e9 + i) for i in range(args.count)]):
+        q.addBindValue(list(values))
+    q.execBatch()
+    select = "SELECT * FROM rows ORDER BY idx DESC;"
+
+    def load_records():
+        q = conn.doQuery(select)
+        records = []
+        while q.next():
+            records += [q.record()]
+        q.finish()
+        return records
+
+    def load_rows():
+        q = conn.doQuery(select)
+        rows = sql.Rows.fromQuery(q)
+        q.finish()
+        return rows
+
+    def measure(load):
+        gc.collect()
+        before = current_rss()
+        start = time.perf_counter()
+        results = load()
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        after = current_rss()
+        return results, elapsed, (after - before) if before and after else None
+
+    report = {}
+    role = Qt.UserRole + 6
+
+    def access(get_value, get_record, count):
+        start = time.perf_counter()
+        for row in range(count):
+            get_value(row)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for row in range(count):
+            get_value(row)
+        warm = time.perf_counter() - start
+        start = time.perf_counter()
+        for row in range(count):
+            get_record(row)
+        return cold, warm, time.perf_counter() - start
+
+    def get_record(record):
+        return {record.fieldName(i): record.value(i) for i in range(len(record))}
+
+    records, records_elapsed, records_memory = measure(load_records)
+    rows, elapsed, memory = measure(load_rows)
+
+    model = sql.Sql(None)
+    model.updateResults(rows)
+    indices = [model.index(row) for row in range(len(rows))]
+    times = access(lambda row: model.data(indices[row], role), model.get, len(rows))
+    report["rows"] = (elapsed, memory, *times)
+
+    times = access(lambda row: records[indices[row].row()].value(role - Qt.UserRole - 1), lambda row: get_record(records[row]), len(records))
+    report["records"] = (records_elapsed, records_memory, *times)
+    model.reset()
+
+    print(f"{args.count} rows, {len(columns)} columns")
+    for name, (elapsed, memory, cold, warm, get) in report.items():
+        memory = f"{memory / 2**20:8.1f}MB" if memory != None else "       ?"
+        print(f"{name:>8} load {elapsed*1000:8.1f}ms {memory} data() {cold*1e9/args.count:7.0f}ns/row first {warm*1e9/args.count:7.0f}ns/row after get() {get*1e9/args.count:7.0f}ns/row")
+
+    conn.close()
+    database.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='qDiffusion benchmarks')
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    decode = subparsers.add_parser("decode", help="thumbnail decode time and quality per mode")
+    decode.add_argument("--folder", type=str, default="", help="folder of synthetic images (created if missing)")
+    decode.add_argument("--count", type=int, default=20)
+    decode.add_argument("--size", type=int, default=256)
+    decode.add_argument("--formats", type=str, nargs="+", default=["png", "jpg"])
+    decode.set_defaults(func=benchmark_decode)
+
+    thumbnail = subparsers.add_parser("thumbnails", help="provider throughput and latency, cold and warm, as JSON")
+    thumbnail.add_argument("--folder", type=str, default="", help="folder of synthetic PNGs (created if missing)")
+    thumbnail.add_argument("--count", type=int, default=100)
+    thumbnail.add_argument("--workers", type=int, default=4)
+    thumbnail.add_argument("--mode", type=str, default="balanced")
+    thumbnail.add_argument("--store", action="store_true", help="enable the persistent store and add a persistent pass")
+    thumbnail.add_argument("--output", type=str, default="", help="write the JSON report to a file")
+    thumbnail.set_defaults(func=benchmark_thumbnails)
+
+    metadata = subparsers.add_parser("metadata", help="PNG header reader against PIL for width, height and parameters")
+    metadata.add_argument("--folder", type=str, default="", help="folder of synthetic PNGs (created if missing)")
+    metadata.add_argument("--count", type=int, default=2000)
+    metadata.set_defaults(func=benchmark_metadata)
+
+    diff = subparsers.add_parser("diff", help="Sql model result diffing for common reload patterns")
+    diff.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    diff.add_argument("--keys", type=str, nargs="+", default=["file", "record"], help="key column, or 'record' to key on whole rows")
+    diff.set_defaults(func=benchmark_diff)
+
+    rows = subparsers.add_parser("rows", help="Sql result storage memory and access time, lazy rows against plain QSqlRecords")
+    rows.add_argument("--count", type=int, default=100000)
+    rows.set_defaults(func=benchmark_rows)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
@@ -1,73 +1,380 @@
-import glob
 import os
+import heapq
+import time
+import struct
+import ctypes
+import ctypes.util
+import platform
 import threading
 
-from PyQt5.QtCore import pyqtSlot, pyqtSignal, QObject, QThreadPool, QRunnable, QFileSystemWatcher
+from PyQt5.QtCore import pyqtSlot, pyqtSignal, QObject, QThreadPool, QRunnable, QFileSystemWatcher, QTimer, QSocketNotifier
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+IN_FOLDER_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+IN_FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+def is_watched_name(name):
+    return not name.startswith(".") and "." in name
+
+class InotifyWatcher(QObject):
+    directoryChanged = pyqtSignal(str)
+    fileChanged = pyqtSignal(str)
+    filesChanged = pyqtSignal(str, list, list)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+        self.descriptors = {}
+        self.notifier = QSocketNotifier(self.fd, QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.onActivated)
+
+    def addPath(self, path):
+        if path in self.descriptors:
+            return True
+        mask = IN_FOLDER_MASK if os.path.isdir(path) else IN_FILE_MASK
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self.paths[wd] = path
+        self.descriptors[path] = wd
+        return True
+
+    def removePath(self, path):
+        wd = self.descriptors.pop(path, None)
+        if wd == None:
+            return False
+        self.paths.pop(wd, None)
+        self.libc.inotify_rm_watch(self.fd, wd)
+        return True
+
+    def close(self):
+        if self.fd >= 0:
+            self.notifier.setEnabled(False)
+            os.close(self.fd)
+            self.fd = -1
+
+    @pyqtSlot()
+    def onActivated(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except (BlockingIOError, OSError):
+            return
+
+        folders = set()
+        changed, removed = {}, {}
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset+INOTIFY_EVENT.size:offset+INOTIFY_EVENT.size+length].rstrip(b"\0")
+            offset += INOTIFY_EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                folders.update(p for p in self.descriptors if os.path.isdir(p))
+                continue
+
+            path = self.paths.get(wd, None)
+            if path == None:
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    if self.descriptors.get(path, None) == wd:
+                        del self.descriptors[path]
+                if path in self.descriptors or not os.path.isdir(path):
+                    self.fileChanged.emit(path)
+                folders.add(os.path.dirname(path))
+                continue
+
+            if not name:
+                self.fileChanged.emit(path)
+                continue
+
+            name = os.fsdecode(name)
+            if mask & IN_ISDIR:
+                folders.add(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.setdefault(path, []).append(name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.setdefault(path, []).append(name)
+
+        for path in set(changed.keys()) | set(removed.keys()):
+            self.filesChanged.emit(path, changed.get(path, []), removed.get(path, []))
+        for path in folders:
+            if path in self.descriptors:
+                self.directoryChanged.emit(path)
+
+def create_backend(parent):
+    if platform.system() == "Linux":
+        try:
+            return InotifyWatcher(parent)
+        except Exception:
+            pass
+    return QFileSystemWatcher(parent)
 
 class WatcherRunnableSignals(QObject):
-    result = pyqtSignal(str, list, list)
-    finished = pyqtSignal(str, int)
-    def __init__(self, folder):
+    result = pyqtSignal(str, int, list, list)
+    added = pyqtSignal(str, int, list, list)
+    modified = pyqtSignal(str, int, list, list)
+    removed = pyqtSignal(str, int, list)
+    stats = pyqtSignal(str, int, object)
+    listed = pyqtSignal(str, int, object, object)
+    finished = pyqtSignal(str, int, int)
+    updated = pyqtSignal(str, int, int)
+    walked = pyqtSignal(str, str, int, object)
+    done = pyqtSignal(int)
+
+class WatcherRunnable(QRunnable):
+    def __init__(self, signals, folder, generation, previous=None):
         super().__init__()
-        self.stopping = False
+        self.setAutoDelete(False)
+        self.signals = signals
         self.folder = folder
+        self.generation = generation
+        self.previous = previous
+        self.stopping = threading.Event()
 
-    @pyqtSlot(str)
-    def die(self, folder):
-        if folder == self.folder:
-            self.stopping = True
+    def stop(self):
+        self.stopping.set()
+
+    def listFolder(self):
+        listing = {}
+        root = os.path.abspath(self.folder)
+        prefix = os.path.join(root, "")
+        if not os.path.isdir(root):
+            return listing
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if self.stopping.is_set():
+                    break
+                if not is_watched_name(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                listing[prefix + entry.name] = (stat.st_mtime_ns, stat.st_size, entry.inode())
+        return listing
+
+    def emitBatches(self, signal, files, idxs, batch_size=128):
+        for i in range(0, len(files), batch_size):
+            if self.stopping.is_set():
+                return False
+            if idxs == None:
+                signal.emit(self.folder, self.generation, files[i:i+batch_size])
+            else:
+                signal.emit(self.folder, self.generation, files[i:i+batch_size], idxs[i:i+batch_size])
+        return not self.stopping.is_set()
+
+    def scan(self, listing, batch_size=128):
+        total = len(listing)
+        mtime = lambda f: listing[f][0]
+
+        first = heapq.nlargest(batch_size, listing.keys(), key=mtime)
+        idxs = {file: total-1-i for i, file in enumerate(first)}
+        if not self.emitBatches(self.signals.result, first, [idxs[f] for f in first]):
+            return None
+
+        remaining = sorted([f for f in listing if not f in idxs], key=mtime, reverse=True)
+        for i, file in enumerate(remaining):
+            idxs[file] = total-1-len(first)-i
+        if not self.emitBatches(self.signals.result, remaining, [idxs[f] for f in remaining]):
+            return None
+        return idxs
+
+    def rescan(self, listing):
+        previous, idxs = self.previous
+        removed = [f for f in previous if not f in listing]
+        added = [f for f in listing if not f in previous]
+        modified = [f for f in listing if f in previous and listing[f] != previous[f]]
+
+        idxs = {f:i for f,i in idxs.items() if f in listing}
+        idx = max(idxs.values(), default=-1) + 1
+        for file in sorted(added + modified, key = lambda f: listing[f][0]):
+            idxs[file] = idx
+            idx += 1
+
+        if not self.emitBatches(self.signals.removed, removed, None):
+            return None
+        if not self.emitBatches(self.signals.modified, modified, [idxs[f] for f in modified]):
+            return None
+        if not self.emitBatches(self.signals.added, added, [idxs[f] for f in added]):
+            return None
+        return idxs
+
+    def run(self):
+        try:
+            listing = self.listFolder()
+            if self.previous == None:
+                idxs = self.scan(listing)
+            else:
+                idxs = self.rescan(listing)
+
+            if idxs == None or self.stopping.is_set():
+                return
 
-class WatcherRunnable(threading.Thread):
-    def __init__(self, folder):
+            self.signals.listed.emit(self.folder, self.generation, listing, idxs)
+            self.signals.stats.emit(self.folder, self.generation, {f: s[:2] for f, s in listing.items()})
+            if self.previous == None:
+                self.signals.finished.emit(self.folder, self.generation, len(listing))
+            else:
+                self.signals.updated.emit(self.folder, self.generation, len(listing))
+        except Exception:
+            return
+        finally:
+            self.signals.done.emit(self.generation)
+
+class WatcherTreeRunnable(QRunnable):
+    def __init__(self, signals, root, folder, generation):
         super().__init__()
-        self.signals = WatcherRunnableSignals(folder)
+        self.setAutoDelete(False)
+        self.signals = signals
+        self.root = root
         self.folder = folder
-        self.daemon = True
-    
+        self.generation = generation
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def walk(self):
+        snapshot = {}
+        visited = set()
+        pending = [self.folder]
+        while pending and not self.stopping.is_set():
+            folder = pending.pop()
+            try:
+                real = os.path.realpath(folder)
+                if real in visited:
+                    continue
+                visited.add(real)
+                files = {}
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            if entry.is_dir():
+                                pending += [entry.path]
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                        except OSError:
+                            continue
+                snapshot[folder] = files
+            except OSError:
+                continue
+        return snapshot
+
     def run(self):
         try:
-            files = glob.glob(os.path.join(self.folder, "*.*"))
-            files = sorted(files, key = os.path.getmtime, reverse=True)
-
-            file_batch = []
-            idx_batch = []
-            batch_size = 128
-            for i, file in enumerate(files):
-                if self.signals.stopping:
-                    return
-                file_batch += [os.path.abspath(file)]
-                idx_batch += [len(files)-1-i]
-                if len(file_batch) >= batch_size or i == len(files) - 1:
-                    self.signals.result.emit(self.folder, file_batch, idx_batch)
-                    file_batch = []
-                    idx_batch = []
-            
-            if not self.signals.stopping:
-                self.signals.finished.emit(self.folder, len(files))
+            snapshot = self.walk()
+            if not self.stopping.is_set():
+                self.signals.walked.emit(self.root, self.folder, self.generation, snapshot)
         except Exception:
             return
+        finally:
+            self.signals.done.emit(self.generation)
+
+class WatcherDelay(QTimer):
+    trigger = pyqtSignal(str)
+    def __init__(self, parent, folder):
+        super().__init__(parent)
+        self.folder = folder
+        self.first = 0
+        self.setSingleShot(True)
+        self.timeout.connect(self.onTimeout)
+
+    def delay(self, quiet, latency):
+        now = time.monotonic()
+        if not self.isActive():
+            self.first = now
+        remaining = latency - int((now - self.first) * 1000)
+        self.start(max(min(quiet, remaining), 0))
+
+    @pyqtSlot()
+    def onTimeout(self):
+        self.trigger.emit(self.folder)
 
 class Watcher(QObject):
     started = pyqtSignal(str)
     parent_changed = pyqtSignal(str)
     folder_changed = pyqtSignal(str, list, list)
+    folder_stats = pyqtSignal(str, object)
+    files_added = pyqtSignal(str, list, list)
+    files_modified = pyqtSignal(str, list, list)
+    files_removed = pyqtSignal(str, list)
     file_changed = pyqtSignal(str)
     finished = pyqtSignal(str, int)
-    kill = pyqtSignal(str)
+    updated = pyqtSignal(str, int)
+    tree_changed = pyqtSignal(str, list)
 
     instance = None
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, quiet=250, latency=2000, workers=2):
         super().__init__(parent)
-        self.watcher = QFileSystemWatcher(self)
+        self.watcher = create_backend(self)
         self.watcher.directoryChanged.connect(self.onFolderChanged)
         self.watcher.fileChanged.connect(self.onFileChanged)
+        if hasattr(self.watcher, "filesChanged"):
+            self.watcher.filesChanged.connect(self.onFilesChanged)
 
         self.folders = set()
         self.parents = {}
+        self.listings = {}
 
-        self.pool = QThreadPool.globalInstance()
+        self.trees = {}
+        self.treeFolders = {}
+        self.treeDelays = {}
+        self.walking = {}
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(workers)
+        self.treePool = QThreadPool(self)
+        self.treePool.setMaxThreadCount(1)
         self.running = {}
+        self.active = {}
+        self.generation = 0
+
+        self.signals = WatcherRunnableSignals()
+        self.signals.result.connect(self.onWatcherResult)
+        self.signals.added.connect(self.onWatcherAdded)
+        self.signals.modified.connect(self.onWatcherModified)
+        self.signals.removed.connect(self.onWatcherRemoved)
+        self.signals.listed.connect(self.onWatcherListed)
+        self.signals.stats.connect(self.onWatcherStats)
+        self.signals.finished.connect(self.onWatcherFinished)
+        self.signals.updated.connect(self.onWatcherUpdated)
+        self.signals.walked.connect(self.onWatcherWalked)
+        self.signals.done.connect(self.onWatcherDone)
+
+        self.quiet = quiet
+        self.latency = latency
+        self.delays = {}
+        self.events = 0
+        self.coalesced = 0
+        self.scans = 0
 
         Watcher.instance = self
 
@@ -75,7 +382,16 @@ class Watcher(QObject):
 
     def wait(self):
         self.stopping = True
+        for delay in list(self.delays.values()) + list(self.treeDelays.values()):
+            delay.stop()
+        for folder in list(self.running.keys()):
+            self.watcherStop(folder)
+        for folder in list(self.walking.keys()):
+            self.treeStop(folder)
         self.pool.waitForDone()
+        self.treePool.waitForDone()
+        if hasattr(self.watcher, "close"):
+            self.watcher.close()
 
     @pyqtSlot(str)
     def watchFile(self, file):
@@ -101,34 +417,130 @@ class Watcher(QObject):
 
     @pyqtSlot(str)
     def unwatchFolder(self, folder):
-        self.kill.emit(folder)
+        self.watcherStop(folder)
+        if folder in self.delays:
+            self.delays.pop(folder).stop()
 
         self.folders.remove(folder)
         parent = self.parents[folder]
         del self.parents[folder]
+        self.listings.pop(folder, None)
 
-        self.watcher.removePath(folder)
-        if not parent in self.parents.values():
+        if not folder in self.treeFolders:
+            self.watcher.removePath(folder)
+        if not parent in self.parents.values() and not parent in self.treeFolders:
             self.watcher.removePath(parent)
 
+    @pyqtSlot(str)
+    def watchTree(self, root):
+        if root in self.trees and root in self.treeFolders:
+            return
+        self.trees.setdefault(root, None)
+        self.treeFolders[root] = root
+        self.watcher.addPath(root)
+        self.treeStart(root)
+
+    @pyqtSlot(str)
+    def unwatchTree(self, root):
+        if not root in self.trees:
+            return
+        for folder, owner in list(self.treeFolders.items()):
+            if owner != root:
+                continue
+            self.treeStop(folder)
+            if folder in self.treeDelays:
+                self.treeDelays.pop(folder).stop()
+            del self.treeFolders[folder]
+            if not folder in self.folders and not folder in self.parents.values():
+                self.watcher.removePath(folder)
+        del self.trees[root]
+
+    def treeFiles(self, root, extensions=None):
+        owner = root if root in self.trees else self.treeFolders.get(root, None)
+        if owner == None:
+            owner = next((r for r in self.trees if root.startswith(os.path.join(r, ""))), None)
+        tree = self.trees.get(owner, None)
+        if tree == None:
+            return None
+        prefix = os.path.join(root, "")
+        files = []
+        for folder, names in tree.items():
+            if owner != root and folder != root and not folder.startswith(prefix):
+                continue
+            for name in names:
+                if extensions == None or name.lower().endswith(extensions):
+                    files += [os.path.join(folder, name)]
+        return files
+
+    def treeDelay(self, folder):
+        self.events += 1
+        if not folder in self.treeDelays:
+            self.treeDelays[folder] = WatcherDelay(self, folder)
+            self.treeDelays[folder].trigger.connect(self.treeStart)
+        if self.treeDelays[folder].isActive():
+            self.coalesced += 1
+        self.treeDelays[folder].delay(self.quiet, self.latency)
+
+    @pyqtSlot(str)
+    def treeStart(self, folder):
+        root = self.treeFolders.get(folder, None)
+        if self.stopping or root == None:
+            return
+        self.scans += 1
+        self.treeStop(folder)
+
+        self.generation += 1
+        runnable = WatcherTreeRunnable(self.signals, root, folder, self.generation)
+        self.walking[folder] = self.generation
+        self.active[self.generation] = runnable
+        self.treePool.start(runnable)
+
+    def treeStop(self, folder):
+        if not folder in self.walking:
+            return
+        generation = self.walking.pop(folder)
+        runnable = self.active.get(generation, None)
+        if runnable:
+            runnable.stop()
+            if self.treePool.tryTake(runnable):
+                del self.active[generation]
+
+    def watcherDelay(self, folder):
+        self.events += 1
+        if not folder in self.delays:
+            self.delays[folder] = WatcherDelay(self, folder)
+            self.delays[folder].trigger.connect(self.watcherStart)
+        if self.delays[folder].isActive():
+            self.coalesced += 1
+        self.delays[folder].delay(self.quiet, self.latency)
+
+    @pyqtSlot(str)
     def watcherStart(self, folder):
         if self.stopping:
             return
+        self.scans += 1
+        self.watcherStop(folder)
 
-        if folder in self.running:
-            self.running[folder].signals.result.disconnect()
-            self.running[folder].signals.finished.disconnect()
-            self.kill.emit(folder)
+        self.generation += 1
+        runnable = WatcherRunnable(self.signals, folder, self.generation, self.listings.get(folder, None))
+        self.running[folder] = self.generation
+        self.active[self.generation] = runnable
 
-        watcher = WatcherRunnable(folder)
-        watcher.signals.result.connect(self.onWatcherResult)
-        watcher.signals.finished.connect(self.onWatcherFinished)
-        self.kill.connect(watcher.signals.die)
+        self.pool.start(runnable)
+        self.started.emit(folder)
 
-        self.running[folder] = watcher
+    def watcherStop(self, folder):
+        if not folder in self.running:
+            return
+        generation = self.running.pop(folder)
+        runnable = self.active.get(generation, None)
+        if runnable:
+            runnable.stop()
+            if self.pool.tryTake(runnable):
+                del self.active[generation]
 
-        watcher.start()
-        self.started.emit(folder)
+    def isCurrent(self, folder, generation):
+        return self.running.get(folder, None) == generation
     
     @pyqtSlot(str)
     def onFileChanged(self, file):
@@ -136,22 +548,150 @@ class Watcher(QObject):
 
     @pyqtSlot(str)
     def onFolderChanged(self, folder):
+        if folder in self.treeFolders:
+            self.treeDelay(folder)
         if folder in self.folders:
-            self.watcherStart(folder)
+            self.watcherDelay(folder)
             return
-        else:
+        elif folder in self.parents.values():
             self.parent_changed.emit(folder)
             for child, parent in list(self.parents.items()):
                 if parent == folder:
                     self.watcher.addPath(child)
-                    self.watcherStart(child)
+                    self.watcherDelay(child)
+
+    @pyqtSlot(str, list, list)
+    def onFilesChanged(self, folder, changed, removed):
+        if folder in self.treeFolders:
+            self.treeDelay(folder)
+        if not folder in self.folders:
+            return
+        if folder in self.running or folder in self.delays and self.delays[folder].isActive() or not folder in self.listings:
+            self.watcherDelay(folder)
+            return
+        self.events += 1
 
-    @pyqtSlot(str, int)
-    def onWatcherFinished(self, folder, total):
-        if folder in self.running:
-            del self.running[folder]
+        root = os.path.join(os.path.abspath(folder), "")
+        listing, idxs = self.listings[folder]
+
+        added, modified, gone = [], [], []
+        for name in set(changed + removed):
+            if not is_watched_name(name):
+                continue
+            file = root + name
+            try:
+                stat = os.stat(file)
+                entry = (stat.st_mtime_ns, stat.st_size, stat.st_ino) if os.path.isfile(file) else None
+            except OSError:
+                entry = None
+            if entry == None:
+                if file in listing:
+                    del listing[file]
+                    del idxs[file]
+                    gone += [file]
+            elif not file in listing:
+                listing[file] = entry
+                added += [file]
+            elif listing[file] != entry:
+                listing[file] = entry
+                modified += [file]
+
+        if not (added or modified or gone):
+            return
+
+        idx = max(idxs.values(), default=-1) + 1
+        for file in sorted(added + modified, key = lambda f: listing[f][0]):
+            idxs[file] = idx
+            idx += 1
+
+        if gone:
+            self.files_removed.emit(folder, gone)
+        if modified:
+            self.files_modified.emit(folder, modified, [idxs[f] for f in modified])
+        if added:
+            self.files_added.emit(folder, added, [idxs[f] for f in added])
+        self.updated.emit(folder, len(listing))
+
+    @pyqtSlot(str, int, int)
+    def onWatcherFinished(self, folder, generation, total):
+        if not self.isCurrent(folder, generation):
+            return
+        del self.running[folder]
         self.finished.emit(folder, total)
 
-    @pyqtSlot(str, list, list)
-    def onWatcherResult(self, folder, files, idxs):
-        self.folder_changed.emit(folder, files, idxs)
\ No newline at end of file
+    @pyqtSlot(str, int, int)
+    def onWatcherUpdated(self, folder, generation, total):
+        if not self.isCurrent(folder, generation):
+            return
+        del self.running[folder]
+        self.updated.emit(folder, total)
+
+    @pyqtSlot(str, str, int, object)
+    def onWatcherWalked(self, root, folder, generation, snapshot):
+        if self.walking.get(folder, None) != generation:
+            return
+        del self.walking[folder]
+        if not root in self.trees:
+            return
+
+        tree = self.trees[root] or {}
+        prefix = os.path.join(folder, "")
+        previous = {f: n for f, n in tree.items() if f == folder or f.startswith(prefix)}
+
+        for f in previous:
+            if not f in snapshot and self.treeFolders.get(f, None) == root:
+                self.treeStop(f)
+                del self.treeFolders[f]
+                if not f in self.folders and not f in self.parents.values():
+                    self.watcher.removePath(f)
+        for f in snapshot:
+            if not f in self.treeFolders:
+                self.treeFolders[f] = root
+                self.watcher.addPath(f)
+
+        changed = sorted(f for f in set(previous) | set(snapshot) if previous.get(f, None) != snapshot.get(f, None))
+        first = self.trees[root] == None
+
+        tree = {f: n for f, n in tree.items() if not f in previous}
+        tree.update(snapshot)
+        self.trees[root] = tree
+
+        if changed or first:
+            self.tree_changed.emit(root, changed)
+
+    @pyqtSlot(int)
+    def onWatcherDone(self, generation):
+        self.active.pop(generation, None)
+
+    @pyqtSlot(str, int, object, object)
+    def onWatcherListed(self, folder, generation, listing, idxs):
+        if folder in self.folders and self.isCurrent(folder, generation):
+            self.listings[folder] = (listing, idxs)
+
+    def stats(self):
+        return {"events": self.events, "coalesced": self.coalesced, "scans": self.scans, "quiet": self.quiet, "latency": self.latency, "running": len(self.running), "active": len(self.active)}
+
+    @pyqtSlot(str, int, list, list)
+    def onWatcherResult(self, folder, generation, files, idxs):
+        if self.isCurrent(folder, generation):
+            self.folder_changed.emit(folder, files, idxs)
+
+    @pyqtSlot(str, int, list, list)
+    def onWatcherAdded(self, folder, generation, files, idxs):
+        if self.isCurrent(folder, generation):
+            self.files_added.emit(folder, files, idxs)
+
+    @pyqtSlot(str, int, list, list)
+    def onWatcherModified(self, folder, generation, files, idxs):
+        if self.isCurrent(folder, generation):
+            self.files_modified.emit(folder, files, idxs)
+
+    @pyqtSlot(str, int, list)
+    def onWatcherRemoved(self, folder, generation, files):
+        if self.isCurrent(folder, generation):
+            self.files_removed.emit(folder, files)
+
+    @pyqtSlot(str, int, object)
+    def onWatcherStats(self, folder, generation, stats):
+        if self.isCurrent(folder, generation):
+            self.folder_stats.emit(folder, stats)
\ No newline at end of file
@@ -77,7 +77,6 @@ class GUI(QObject):
         super().__init__(parent)
         self.db = sql.Database(self)
         self.watcher = filesystem.Watcher()
-        self.thumbnails = thumbnails.ThumbnailStorage((256,256),(640, 640),75, self)
 
         self._window_active = True
         
@@ -112,9 +111,21 @@ class GUI(QObject):
             "swap": False, "advanced": False, "autocomplete": 1, "vocab": [], "enforce_versions": True,
             "host_enabled": False, "host_address": "127.0.0.1", "host_port": 28888, "host_tunnel": False,
             "host_read_only": True, "host_monitor": False, "tabs": [], "grid_save_all": False,
-            "scaling": False
+            "scaling": False, "thumbnail_cache": "thumbnails.db", "thumbnail_memory": 256, "thumbnail_big_memory": 256,
+            "thumbnail_workers": 4, "thumbnail_mode": "balanced", "gallery_index": "gallery.db",
+            "gallery_workers": 4
         })
         self._config.updated.connect(self.onConfigUpdated)
+
+        budgets = {
+            (256,256): self._config._values.get("thumbnail_memory") * 1024 * 1024,
+            (640,640): self._config._values.get("thumbnail_big_memory") * 1024 * 1024
+        }
+        self.thumbnails = thumbnails.ThumbnailStorage((256,256),(640, 640),75, self._config._values.get("thumbnail_cache"), budgets, self._config._values.get("thumbnail_workers"), self._config._values.get("thumbnail_mode"), self)
+        self.watcher.folder_stats.connect(self.thumbnails.revalidate)
+        self.watcher.files_modified.connect(self.thumbnails.onFilesModified)
+        self.watcher.files_removed.connect(self.thumbnails.onFilesRemoved)
+
         self._remoteStatus = RemoteStatusMode.INACTIVE
         self._remoteLatency = 0
 
@@ -152,7 +163,7 @@ class GUI(QObject):
 
         parent.aboutToQuit.connect(self.stop)
 
-        self.watcher.finished.connect(self.onFolderChanged)
+        self.watcher.tree_changed.connect(self.onTreeChanged)
 
         if parent.endpoint:
             self.parseEndpoint(parent.endpoint)
@@ -163,6 +174,7 @@ class GUI(QObject):
         self.backend.wait()
         self.watcher.wait()
         self.signaller.wait()
+        self.db.stop()
     
     def registerTabs(self, tabs):
         self.tabs = tabs
@@ -504,12 +516,17 @@ class GUI(QObject):
                 self._results[id][name] += [d]
         self.result.emit(id, name)
     
-    @pyqtSlot(str, int)
-    def onFolderChanged(self, folder, total):
-        if folder in self._modelFolders:
-            if self._statusMode != StatusMode.STARTING:
-                self.refreshModels()
+    @pyqtSlot(str, list)
+    def onTreeChanged(self, root, folders):
+        if not root in self._modelFolders:
             return
+        wildcards = self.wildcardDirectory()
+        prefix = os.path.join(wildcards, "")
+        wild = [f for f in folders if f == wildcards or f.startswith(prefix)]
+        if wild or not folders:
+            self.wildcards.reload()
+        if (len(wild) != len(folders) or not folders) and self._statusMode != StatusMode.STARTING:
+            self.backend.makeRequest({"type":"options"})
 
     @pyqtSlot()
     def refreshModels(self):
@@ -702,18 +719,32 @@ class GUI(QObject):
     def modelDirectory(self):
         return self._config._values.get("model_directory")
     
+    def wildcardDirectory(self):
+        return os.path.abspath(os.path.join(self.modelDirectory(), "WILDCARD"))
+
+    def modelFiles(self, extensions):
+        files = []
+        for folder in self._modelFolders:
+            found = self.watcher.treeFiles(folder, extensions)
+            if found == None:
+                return None
+            files += found
+        return files
+
     def outputDirectory(self):
         return self._config._values.get("output_directory")
     
     @pyqtSlot()
     def watchModelDirectory(self):
-        folders = ["SD", "LoRA", "SR", "TI", "Stable-diffusion", "ESRGAN", "RealESRGAN", "Lora", os.path.join("..", "embeddings"), "WILDCARD"]
-        folders = [os.path.abspath(os.path.join(self.modelDirectory(), f)) for f in folders]
+        folders = [os.path.abspath(os.path.join(self.modelDirectory(), f)) for f in ["", os.path.join("..", "embeddings")]]
         folders = [f for f in folders if os.path.exists(f)]
+        for folder in self._modelFolders:
+            if not folder in folders:
+                self.watcher.unwatchTree(folder)
         for folder in folders:
-            if not folder in self._modelFolders and os.path.exists(folder):
-                self.watcher.watchFolder(folder)
-                self._modelFolders += [folder]
+            if not folder in self._modelFolders:
+                self.watcher.watchTree(folder)
+        self._modelFolders = folders
         self._trashFolder = os.path.join(self.modelDirectory(), "TRASH")
 
     @pyqtSlot(str, result=str)
@@ -3,6 +3,8 @@ import re
 import random
 import copy
 import json
+import struct
+import zlib
 
 import PIL.Image
 import PIL.PngImagePlugin
@@ -132,6 +134,107 @@ def getParameters(img):
             params += f", Denoising strength: {data['strength']}"
     return params
 
+SEARCH_NETWORK = re.compile(r"<(\w+):([^:>]+)(?::[^>]*)?>")
+SEARCH_WILDCARD = re.compile(r"__([^_\s][^\s]*?)__")
+SEARCH_WEIGHT = re.compile(r":\s*-?\d*\.?\d+\s*(?=[)\]])")
+SEARCH_SEPARATOR = re.compile(r"\W")
+
+def getSearchText(text):
+    def network(m):
+        name = m.group(2).strip()
+        return f" {m.group(1).lower()}_{SEARCH_SEPARATOR.sub('_', name)} {name} "
+    def wildcard(m):
+        name = m.group(1)
+        return f" wildcard_{SEARCH_SEPARATOR.sub('_', name)} {name} "
+    text = SEARCH_NETWORK.sub(network, text)
+    text = SEARCH_WILDCARD.sub(wildcard, text)
+    text = SEARCH_WEIGHT.sub(" ", text)
+    return text
+
+def getSearchFields(json):
+    settings = ", ".join(f"{k} {v}" for k, v in json.items() if not k in {"prompt", "negative_prompt"})
+    return getSearchText(json["prompt"]), getSearchText(json["negative_prompt"]), settings
+
+def getSearchMatch(text):
+    terms = []
+    for term in text.split(";"):
+        tokens = re.findall(r"\w+", getSearchText(term))
+        if tokens:
+            terms += ["(" + " AND ".join('"' + t + '"*' for t in tokens) + ")"]
+    return " AND ".join(terms)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def readPNGHeader(f):
+    width, height, text = 0, 0, {}
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunk = struct.unpack(">I4s", header)
+        if chunk in {b"IDAT", b"IEND"}:
+            break
+        if not chunk in {b"IHDR", b"tEXt", b"zTXt", b"iTXt"}:
+            f.seek(length + 4, 1)
+            continue
+        data = f.read(length)
+        f.seek(4, 1)
+        try:
+            if chunk == b"IHDR":
+                width, height = struct.unpack(">II", data[:8])
+            elif chunk == b"tEXt":
+                key, value = data.split(b"\0", 1)
+                text[key.decode("latin-1")] = value.decode("latin-1")
+            elif chunk == b"zTXt":
+                key, value = data.split(b"\0", 1)
+                text[key.decode("latin-1")] = zlib.decompress(value[1:]).decode("latin-1")
+            elif chunk == b"iTXt":
+                key, value = data.split(b"\0", 1)
+                compressed, value = value[0], value[2:]
+                _, _, value = value.split(b"\0", 2)
+                if compressed:
+                    value = zlib.decompress(value)
+                text[key.decode("latin-1")] = value.decode("utf-8")
+        except Exception:
+            continue
+    return width, height, text
+
+def readJPEGHeader(f):
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in {0xD8, 0x01} or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        if marker[1] in {0xD9, 0xDA}:
+            return None
+        length = struct.unpack(">H", f.read(2))[0]
+        if marker[1] in JPEG_SOF:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height, {}
+        f.seek(length - 2, 1)
+
+def getImageHeader(file):
+    header = None
+    try:
+        with open(file, "rb") as f:
+            signature = f.read(8)
+            if signature == PNG_SIGNATURE:
+                header = readPNGHeader(f)
+            elif signature[:2] == b"\xFF\xD8":
+                f.seek(2)
+                header = readJPEGHeader(f)
+    except Exception:
+        header = None
+    if header:
+        return header
+    try:
+        with PIL.Image.open(file) as img:
+            return img.size[0], img.size[1], {k:v for k,v in img.info.items() if type(v) == str}
+    except Exception:
+        return None
+
 def formatRecipe(metadata):
     if metadata == None:
         return ""
@@ -3,11 +3,15 @@ import sys
 from typing import *
 import time
 import threading
+import bisect
+import queue
 
 from PyQt5.QtCore import pyqtProperty, pyqtSlot, pyqtSignal, Qt, QObject, QThread, QAbstractListModel, QByteArray, QModelIndex, QTimer, QVariant
 from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlDriver
 from PyQt5.QtQml import qmlRegisterType
 
+QUERY_WORKERS = 4
+
 class NotificationDelay(QTimer):
     notification = pyqtSignal(str)
     def __init__(self, parent, table, interval=100):
@@ -34,6 +38,21 @@ class Database(QObject):
 
         self.timers = {}
 
+        self.queries = queue.Queue()
+        self.workers = [QueryWorker(self.queries) for _ in range(QUERY_WORKERS)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, runnable):
+        self.queries.put(runnable)
+
+    def stop(self):
+        for worker in self.workers:
+            self.queries.put(None)
+        for worker in self.workers:
+            worker.wait()
+        self.workers = []
+
     @pyqtSlot(str)
     def onNotification(self, table):
         if not table in self.timers:
@@ -53,15 +72,28 @@ class Connection(QObject):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.db = None
+        self.notify = False
 
-    def connect(self):
+    def connect(self, notify=True):
         name = f"db_{random.randint(0, 2**32)}"
         db = QSqlDatabase.cloneDatabase("database", name)
         db.open()
-        db.driver().notification[str].connect(Database.instance.onNotification)
-        Database.instance.notification.connect(self.relayNotification)
+        if notify:
+            db.driver().notification[str].connect(Database.instance.onNotification)
+            Database.instance.notification.connect(self.relayNotification)
 
         self.db = db
+        self.notify = notify
+
+    def close(self):
+        if not self.db:
+            return
+        if self.notify:
+            Database.instance.notification.disconnect(self.relayNotification)
+        name = self.db.connectionName()
+        self.db.close()
+        self.db = None
+        QSqlDatabase.removeDatabase(name)
 
     def enableNotifications(self, table):
         if not table in self.db.driver().subscribedToNotifications():
@@ -74,6 +106,7 @@ class Connection(QObject):
     def doQuery(self, q):
         if type(q) == str:
             query = QSqlQuery(self.db)
+            query.setForwardOnly(True)
             query.prepare(q)
             q = query
         
@@ -95,19 +128,116 @@ class Connection(QObject):
     def relayNotification(self, table):
         self.notification.emit(table)
 
+class Rows():
+    def __init__(self, fields=[], rows=None):
+        self.fields = list(fields)
+        self.rows = rows if rows != None else []
+        self.lookup = {f: i for i, f in enumerate(self.fields)}
+
+    @staticmethod
+    def fromQuery(q):
+        record = q.record()
+        rows = []
+        while q.next():
+            rows += [q.record()]
+        return Rows([record.fieldName(i) for i in range(record.count())], rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return Rows(self.fields, self.rows[index])
+
+    def __setitem__(self, index, rows):
+        if not self.fields:
+            self.__init__(rows.fields, list(rows.rows))
+            return
+        self.rows[index] = rows.rows
+
+    def __delitem__(self, index):
+        del self.rows[index]
+
+    def __add__(self, rows):
+        return Rows(self.fields or rows.fields, self.rows + rows.rows)
+
+    def indexOf(self, field):
+        return self.lookup.get(field, -1)
+
+    def row(self, row):
+        values = self.rows[row]
+        if type(values) != tuple:
+            values = tuple(values.value(i) for i in range(len(self.fields)))
+            self.rows[row] = values
+        return values
+
+    def column(self, field):
+        if not field in self.lookup:
+            return None
+        column = self.lookup[field]
+        return [r[column] if type(r) == tuple else r.value(column) for r in self.rows]
+
+    def value(self, row, column=0):
+        return self.row(row)[column]
+
+    def record(self, row):
+        return dict(zip(self.fields, self.row(row)))
+
+    def equal(self, row, rows, other):
+        a, b = self.rows[row], rows.rows[other]
+        if type(a) != tuple and type(b) != tuple:
+            return a == b
+        return self.row(row) == rows.row(other)
+
+    def reversed(self):
+        return Rows(self.fields, self.rows[::-1])
+
+    def matching(self, rows):
+        a, b = self.rows, rows.rows
+        total = min(len(a), len(b))
+        first = 0
+        if a[:total] == b[:total]:
+            first = total
+        while first < total and self.equal(first, rows, first):
+            first += 1
+        last = 0
+        if first < total and a[len(a)-(total-first):] == b[len(b)-(total-first):]:
+            last = total - first
+        while last < total - first and self.equal(-1-last, rows, -1-last):
+            last += 1
+        return first, last
+
+class QueryWorker(QThread):
+    def __init__(self, queries):
+        super().__init__()
+        self.queries = queries
+
+    def run(self):
+        conn = Connection()
+        conn.connect(False)
+        while True:
+            runnable = self.queries.get()
+            if runnable == None:
+                break
+            if not runnable.stopping:
+                runnable.run(conn)
+        conn.close()
+
 class QueryRunnableSignals(QObject):
-    done = pyqtSignal(bool, str)
+    done = pyqtSignal(bool, int)
     def __init__(self):
         super().__init__()
     
-class QueryRunnable(QThread):
-    def __init__(self, query, partial):
-        super().__init__()
+class QueryRunnable():
+    def __init__(self, generation, query, partial, request=None):
+        self.generation = generation
         self.query = query
         self.signals = QueryRunnableSignals()
         self.errored = None
-        self.results = []
+        self.results = Rows()
         self.partial = partial
+        self.request = request
+        self.pages = {}
+        self.handled = False
         self.stopping = False
 
     def runQuery(self, query, partial, limit=0):
@@ -117,31 +247,83 @@ class QueryRunnable(QThread):
 
         self.errored = q.lastError().isValid()
         if self.errored:
-            self.signals.done.emit()
+            self.signals.done.emit(False, self.generation)
             return
-        self.results = []
-        while q.next():
-            self.results += [q.record()]
+        self.results = Rows.fromQuery(q)
         q.finish()
 
         if self.stopping:
             return
         
-        self.signals.done.emit(partial and len(self.results) == limit, self.query)
-
-    def run(self):
-        self.conn = Connection()
-        self.conn.connect()
-
-        if self.partial:
+        self.signals.done.emit(partial and len(self.results) == limit, self.generation)
+
+    def runPages(self):
+        for name, query in self.request["queries"]:
+            q = self.conn.doQuery(query)
+            if self.stopping:
+                return
+            self.errored = q.lastError().isValid()
+            if self.errored:
+                self.signals.done.emit(False, self.generation)
+                return
+            self.pages[name] = Rows.fromQuery(q)
+            q.finish()
+
+        if not self.stopping:
+            self.signals.done.emit(False, self.generation)
+
+    def run(self, conn):
+        self.conn = conn
+
+        if self.request:
+            self.runPages()
+        elif self.partial:
             limit = 64
             self.runQuery(self.query[:-1] + f" LIMIT {limit};", True, limit)
         else:
             self.runQuery(self.query, False)
+        self.conn = None
 
     def stop(self):
         self.stopping = True
 
+DUPLICATE = object()
+PAGE_ORDER = {"ASC": ("<", ">", "DESC"), "DESC": (">", "<", "ASC")}
+
+def sql_literal(value):
+    if type(value) in {int, float}:
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def moved_indices(sequence):
+    if all(a < b for a, b in zip(sequence, sequence[1:])):
+        return []
+    tails, tailIndices, previous = [], [], [-1] * len(sequence)
+    for i, value in enumerate(sequence):
+        j = bisect.bisect_left(tails, value)
+        if j == len(tails):
+            tails += [value]
+            tailIndices += [i]
+        else:
+            tails[j] = value
+            tailIndices[j] = i
+        previous[i] = tailIndices[j-1] if j > 0 else -1
+    stable = set()
+    i = tailIndices[-1] if tailIndices else -1
+    while i != -1:
+        stable.add(i)
+        i = previous[i]
+    return [i for i in range(len(sequence)) if not i in stable]
+
+def contiguous_ranges(indices):
+    ranges = []
+    for i in indices:
+        if ranges and ranges[-1][1] == i - 1:
+            ranges[-1][1] = i
+        else:
+            ranges += [[i, i]]
+    return ranges
+
 class Sql(QAbstractListModel):
     queryChanged = pyqtSignal()
     resultsChanged = pyqtSignal()
@@ -149,7 +331,9 @@ class Sql(QAbstractListModel):
     def __init__(self, parent):
         super().__init__(parent)
 
-        self.results = []
+        self.results = Rows()
+        self.offset = 0
+        self.after = 0
 
         self.conn = Connection(self)
         self.conn.connect()
@@ -158,15 +342,23 @@ class Sql(QAbstractListModel):
         self.errored = False
         self.currentQuery = ""
         self.fieldNames: Dict[int, QByteArray] = {}
+        self.roleColumns: Dict[int, int] = {}
 
         self.reloadTimer = QTimer(self)
         self.reloadTimer.setSingleShot(True)
         self.reloadTimer.timeout.connect(self.reload)
 
         self.runnable = None
+        self.generation = 0
 
         self._partial = False 
         self._debug = False
+        self._keyColumn = ""
+        self._pageSize = 0
+        self._pageKey = ""
+
+        self.paging = None
+        self.pendingRow = None
 
     @pyqtProperty(bool, notify=queryChanged)
     def debug(self):
@@ -176,6 +368,30 @@ class Sql(QAbstractListModel):
     def debug(self, value):
         self._debug = value
         
+    @pyqtProperty(str, notify=queryChanged)
+    def keyColumn(self):
+        return self._keyColumn
+
+    @keyColumn.setter
+    def keyColumn(self, value):
+        self._keyColumn = value
+
+    @pyqtProperty(int, notify=queryChanged)
+    def pageSize(self):
+        return self._pageSize
+
+    @pageSize.setter
+    def pageSize(self, value):
+        self._pageSize = value
+
+    @pyqtProperty(str, notify=queryChanged)
+    def pageKey(self):
+        return self._pageKey
+
+    @pageKey.setter
+    def pageKey(self, value):
+        self._pageKey = value
+
     @pyqtProperty(str, notify=queryChanged)
     def query(self):
         return self.currentQuery
@@ -193,31 +409,116 @@ class Sql(QAbstractListModel):
 
         self.currentQuery = value
         if not value:
+            self.cancelQuery()
             self.reset()
             return
         
         if self._debug:
             print("RUN")
 
-        self.runQuery(self.currentQuery, different)
+        self.paging = self.getPaging(value)
+        if self.paging:
+            self.runPages(self.pageRequest("reload" if not different and self.rowCount() else "reset"))
+        else:
+            self.clearWindow()
+            self.runQuery(self.currentQuery, different)
+
+    def getPaging(self, query):
+        if not self._pageSize or not self._pageKey:
+            return None
+        query = query.strip().rstrip(";").rstrip()
+        for direction in PAGE_ORDER:
+            suffix = f" ORDER BY {self._pageKey} {direction}"
+            if query.upper().endswith(suffix.upper()):
+                return (query[:-len(suffix)], self._pageKey, direction)
+        return None
+
+    def pageQuery(self, where="", reverse=False, limit=0, offset=0):
+        base, key, direction = self.paging
+        if reverse:
+            direction = PAGE_ORDER[direction][2]
+        where = f" WHERE {where}" if where else ""
+        return f"SELECT * FROM ({base}){where} ORDER BY {key} {direction} LIMIT {limit} OFFSET {offset};"
+
+    def pageCondition(self, rows, row, relation):
+        _, key, direction = self.paging
+        before, after, _ = PAGE_ORDER[direction]
+        value = sql_literal(rows.value(row, rows.indexOf(key)))
+        return {"before": f"{key} {before} {value}", "after": f"{key} {after} {value}", "from": f"{key} {after}= {value}"}[relation]
+
+    def pageRequest(self, kind, row=0):
+        base, _, _ = self.paging
+        size = self._pageSize
+        queries = []
+        if kind in {"reset", "reload"}:
+            queries += [("total", f"SELECT COUNT(*) FROM ({base});")]
+        if kind == "reset":
+            queries += [("page", self.pageQuery(limit=size*2))]
+        elif kind == "reload":
+            if self.results:
+                queries += [("before", f"SELECT COUNT(*) FROM ({base}) WHERE {self.pageCondition(self.results, 0, 'before')};")]
+                queries += [("page", self.pageQuery(self.pageCondition(self.results, 0, "from"), limit=max(len(self.results), size)))]
+            else:
+                row = min(self.offset, max(self.rowCount() - size, 0))
+                queries += [("page", self.pageQuery(limit=size*2, offset=row))]
+        elif kind == "forward":
+            queries += [("page", self.pageQuery(self.pageCondition(self.results, len(self.results)-1, "after"), limit=size))]
+        elif kind == "backward":
+            queries += [("page", self.pageQuery(self.pageCondition(self.results, 0, "before"), reverse=True, limit=size))]
+        elif kind == "jump":
+            row = max(row - size, 0)
+            queries += [("page", self.pageQuery(limit=size*2, offset=row))]
+        return {"kind": kind, "row": row, "queries": queries}
+
+    def runPages(self, request):
+        self.runQuery(self.currentQuery, False, request)
+
+    def requestRow(self, row):
+        if not self.paging:
+            return
+        if self.runnable and not self.runnable.handled:
+            self.pendingRow = row
+            return
+        self.pendingRow = None
+        end = self.offset + len(self.results)
+        if self.results and end <= row < end + self._pageSize:
+            self.runPages(self.pageRequest("forward"))
+        elif self.results and self.offset - self._pageSize <= row < self.offset:
+            self.runPages(self.pageRequest("backward"))
+        else:
+            self.runPages(self.pageRequest("jump", row))
 
-    def runQuery(self, query, partial):
+    def runQuery(self, query, partial, request=None):
         if self.runnable:
             self.runnable.stop()
-            self.runnable.wait()
-        self.runnable = QueryRunnable(query, partial)
+            if not self.runnable.handled and self.runnable.request and self.runnable.request["kind"] in {"forward", "backward", "jump"} and self.pendingRow == None:
+                self.pendingRow = self.runnable.request["row"] if self.runnable.request["kind"] == "jump" else self.offset
+        self.generation += 1
+        self.runnable = QueryRunnable(self.generation, query, partial, request)
         self.runnable.signals.done.connect(self.onDone)
-        self.runnable.start()
+        Database.instance.submit(self.runnable)
+
+    def cancelQuery(self):
+        if self.runnable:
+            self.runnable.stop()
+        self.generation += 1
 
-    @pyqtSlot(bool, str)
-    def onDone(self, partial, query):
-        if query != self.currentQuery:
+    @pyqtSlot(bool, int)
+    def onDone(self, partial, generation):
+        if generation != self.generation:
             return
+        self.runnable.handled = True
 
         self.errored = self.runnable.errored
         if self.errored:
             self.reset()
             return
+
+        if self.runnable.request:
+            self.onPage(self.runnable.request, self.runnable.pages)
+            if self.pendingRow != None and not self.isLoaded(self.pendingRow):
+                self.requestRow(self.pendingRow)
+            return
         
         self._partial = partial
         self.partialChanged.emit()
@@ -225,134 +526,277 @@ class Sql(QAbstractListModel):
         newResults = self.runnable.results
 
         if self._debug:
-            print(len(self.results), len(newResults), query)
+            print(len(self.results), len(newResults), self.currentQuery)
 
         self.updateResults(newResults)
         self.roleNames()
 
         if partial:
             self.runQuery(self.currentQuery, False)
-    
-    def updateResults(self, newResults):
-        def find(a, b):
-            for i, e in enumerate(a):
-                if e == b:
-                    return i
-            return -1
 
+    def isLoaded(self, row):
+        return self.offset <= row < self.offset + len(self.results)
+
+    def onPage(self, request, pages):
+        kind = request["kind"]
+        page = pages.get("page", Rows())
+        capacity = self._pageSize * 4
+
+        if self._partial:
+            self._partial = False
+            self.partialChanged.emit()
+
+        if kind == "reset":
+            total = pages["total"].value(0) if pages["total"] else 0
+            if self.rowCount():
+                self.beginRemoveRows(QModelIndex(), 0, self.rowCount()-1)
+                self.results, self.offset, self.after = Rows(), 0, 0
+                self.endRemoveRows()
+            if page:
+                self.updateFieldNames(page.fields)
+            if total:
+                self.beginInsertRows(QModelIndex(), 0, total-1)
+                self.results, self.offset, self.after = page, 0, max(total - len(page), 0)
+                self.endInsertRows()
+            self.resultsChanged.emit()
+            return
+
+        if kind == "reload":
+            total = pages["total"].value(0) if pages["total"] else 0
+            if "before" in pages:
+                before = pages["before"].value(0)
+            else:
+                before = min(request["row"], total)
+            delta = before - self.offset
+            if delta > 0:
+                self.beginInsertRows(QModelIndex(), 0, delta-1)
+                self.offset += delta
+                self.endInsertRows()
+            elif delta < 0:
+                self.beginRemoveRows(QModelIndex(), 0, -delta-1)
+                self.offset += delta
+                self.endRemoveRows()
+            self.updateResults(page)
+            after = max(total - self.offset - len(self.results), 0)
+            delta = after - self.after
+            end = self.rowCount()
+            if delta > 0:
+                self.beginInsertRows(QModelIndex(), end, end+delta-1)
+                self.after += delta
+                self.endInsertRows()
+            elif delta < 0:
+                self.beginRemoveRows(QModelIndex(), end+delta, end-1)
+                self.after += delta
+                self.endRemoveRows()
+            self.resultsChanged.emit()
+            return
+
+        if kind == "forward":
+            page = page[:self.after]
+            first = self.offset + len(self.results)
+            self.results = self.results + page
+            self.after -= len(page)
+            trim = max(len(self.results) - capacity, 0)
+            self.results = self.results[trim:]
+            self.offset += trim
+        elif kind == "backward":
+            page = page.reversed()[-self.offset:] if self.offset else Rows()
+            first = self.offset - len(page)
+            self.results = page + self.results
+            self.offset -= len(page)
+            trim = max(len(self.results) - capacity, 0)
+            if trim:
+                self.results = self.results[:-trim]
+                self.after += trim
+        elif kind == "jump":
+            total = self.rowCount()
+            first = min(request["row"], total)
+            page = page[:total - first]
+            self.results, self.offset, self.after = page, first, total - first - len(page)
+
+        if page:
+            self.dataChanged.emit(self.index(first), self.index(first + len(page) - 1))
+
+    def resultKeys(self, results):
+        column = results.indexOf(self._keyColumn) if self._keyColumn else -1
+        keys, seen = [], {}
+        for key in (results.column(self._keyColumn) if column != -1 else (results.row(i) for i in range(len(results)))):
+            if key in seen:
+                seen[key] += 1
+                key = (DUPLICATE, key, seen[key])
+            else:
+                seen[key] = 0
+            keys += [key]
+        return keys
+
+    def removeResults(self, indices, offset, keys):
+        for first, last in reversed(contiguous_ranges(indices)):
+            self.beginRemoveRows(QModelIndex(), self.offset+offset+first, self.offset+offset+last)
+            del self.results[offset+first:offset+last+1]
+            del keys[first:last+1]
+            self.endRemoveRows()
+
+    def updateResults(self, newResults):
         if newResults:
-            self.updateFieldNames(newResults[0])
-        else:
+            self.updateFieldNames(newResults.fields)
+        elif not self.paging:
             self.fieldNames = {}
-        
+            self.roleColumns = {}
+
+        if self.results and newResults and self.results.fields != newResults.fields:
+            self.beginRemoveRows(QModelIndex(), self.offset, self.offset+len(self.results)-1)
+            self.results = Rows()
+            self.endRemoveRows()
+
         if len(self.results) == 0 and len(newResults) != 0:
-            self.beginInsertRows(QModelIndex(), 0, len(newResults)-1)
+            self.beginInsertRows(QModelIndex(), self.offset, self.offset+len(newResults)-1)
             self.results = newResults
             self.endInsertRows()
             self.resultsChanged.emit()
             return
 
         if len(self.results) != 0 and len(newResults) == 0:
-            self.beginRemoveRows(QModelIndex(), 0, len(self.results)-1)
-            self.results = []
+            self.beginRemoveRows(QModelIndex(), self.offset, self.offset+len(self.results)-1)
+            self.results = Rows()
             self.endRemoveRows()
             self.resultsChanged.emit()
             return
 
-        totalResults = len(newResults)
+        first, last = self.results.matching(newResults)
 
-        changed = False
-        i = 0
-        while newResults and i < len(self.results):
-            if self.results[i] == newResults[0]:
-                newResults.pop(0)
-                i += 1
-                continue
+        if first == len(self.results) == len(newResults):
+            return
+
+        oldKeys = self.resultKeys(self.results[first:len(self.results)-last])
+        keys = self.resultKeys(newResults[first:len(newResults)-last])
+        positions = {k: i for i, k in enumerate(keys)}
 
-            srcIdx = find(self.results[i:], newResults[0])
-            dstIdx = find(newResults, self.results[i])
-            if srcIdx == -1 and dstIdx == -1:
-                self.results[i] = newResults.pop(0)
-                self.dataChanged.emit(self.index(i), self.index(i))
-                changed = True
+        removed = [i for i, k in enumerate(oldKeys) if not k in positions]
+        if removed:
+            self.removeResults(removed, first, oldKeys)
+
+        moved = moved_indices([positions[k] for k in oldKeys])
+        if moved:
+            self.removeResults(moved, first, oldKeys)
+
+        i = 0
+        while i < len(keys):
+            if i < len(oldKeys) and oldKeys[i] == keys[i]:
                 i += 1
                 continue
-            
-            if srcIdx > 0:
-                self.beginRemoveRows(QModelIndex(), i, i+srcIdx-1)
-                self.results = self.results[:i] + self.results[i+srcIdx:]
-                self.endRemoveRows()
-                changed = True
-        
-            if dstIdx > 0:
-                self.beginInsertRows(QModelIndex(), i, i+dstIdx-1)
-                self.results = self.results[:i] + newResults[:dstIdx] + self.results[i:]
-                self.endInsertRows()
-                changed = True
-                newResults = newResults[dstIdx:]
-                i += dstIdx
-
-        if newResults:
-            self.beginInsertRows(QModelIndex(), i, i+len(newResults)-1)
-            self.results += newResults
+            end = positions[oldKeys[i]] if i < len(oldKeys) else len(keys)
+            self.beginInsertRows(QModelIndex(), self.offset+first+i, self.offset+first+end-1)
+            self.results[first+i:first+i] = newResults[first+i:first+end]
+            oldKeys[i:i] = keys[i:end]
             self.endInsertRows()
-            changed = True
-        
-        if len(self.results) > totalResults:
-            self.beginRemoveRows(QModelIndex(), totalResults, len(self.results))
-            self.results = self.results[:totalResults]
-            self.endRemoveRows()
-            changed = True
+            i = end
 
-        if changed:
-            self.resultsChanged.emit()
+        if self._keyColumn:
+            updated = [i for i in range(first, first+len(keys)) if not self.results.equal(i, newResults, i)]
+            for a, b in contiguous_ranges(updated):
+                self.results[a:b+1] = newResults[a:b+1]
+                self.dataChanged.emit(self.index(self.offset+a), self.index(self.offset+b))
+
+        self.resultsChanged.emit()
 
     def data(self, index, role):
         value = QVariant()
-        if role > Qt.UserRole:
-            column = role - Qt.UserRole - 1
-            row = index.row()
-            if row < len(self.results):
-                value = self.results[row].value(column)
-        elif role == Qt.UserRole:
-            row = index.row()
-            if row < len(self.results):
-                value = self.results[row].value(0)
+        row = index.row() - self.offset
+        if row < 0 or row >= len(self.results):
+            if self.paging and index.row() < self.rowCount():
+                self.requestRow(index.row())
+            return value
+        column = self.roleColumns.get(role)
+        if column != None:
+            value = self.results.value(row, column)
         return value
 
-    @pyqtSlot(int, result='QVariant')
-    def get(self, index):
-        if len(self.results) <= index:
+    def fetchRecord(self, index):
+        if self.isLoaded(index):
+            return self.results.record(index - self.offset)
+        if not self.paging or index < 0 or index >= self.rowCount():
             return None
+        q = self.conn.doQuery(self.pageQuery(limit=1, offset=index))
+        rows = Rows.fromQuery(q)
+        q.finish()
+        return rows.record(0) if rows else None
 
-        out = {}
-        record = self.results[index]
-        for i in range(len(record)):
-            out[record.fieldName(i)] = record.value(i)
-        return out
+    @pyqtSlot(int, result='QVariant')
+    def get(self, index):
+        return self.fetchRecord(index)
+
+    @pyqtSlot(int, int, str, result=list)
+    def getLoadedRange(self, first, last, column):
+        first, last = max(first, self.offset), min(last, self.offset + len(self.results) - 1)
+        values = self.results[first - self.offset:last - self.offset + 1].column(column) if first <= last else None
+        return values or []
+
+    @pyqtSlot(int, int, str, result=list)
+    def getRange(self, first, last, column):
+        first, last = max(first, 0), min(last, self.rowCount() - 1)
+        if first > last:
+            return []
+        if self.isLoaded(first) and self.isLoaded(last):
+            values = self.results.column(column)
+            return values[first - self.offset:last - self.offset + 1] if values != None else []
+        if not self.paging:
+            return []
+        q = self.conn.doQuery(self.pageQuery(limit=last - first + 1, offset=first))
+        rows = Rows.fromQuery(q)
+        q.finish()
+        return list(rows.column(column) or [])
+
+    @pyqtSlot(str, 'QVariant', result=int)
+    def indexOf(self, column, value):
+        values = self.results.column(column)
+        if values != None and value in values:
+            return self.offset + values.index(value)
+        if not self.paging:
+            return -1
+        base, key, _ = self.paging
+        q = self.conn.doQuery(f"SELECT * FROM ({base}) WHERE {column} = {sql_literal(value)} LIMIT 1;")
+        rows = Rows.fromQuery(q)
+        q.finish()
+        if not rows:
+            return -1
+        q = self.conn.doQuery(f"SELECT COUNT(*) FROM ({base}) WHERE {self.pageCondition(rows, 0, 'before')};")
+        index = q.value(0) if q.next() else -1
+        q.finish()
+        return index
     
     @pyqtProperty(int, notify=resultsChanged)
     def length(self):
-        return len(self.results)
+        return self.rowCount()
 
-    def updateFieldNames(self, record):
+    def updateFieldNames(self, fields):
         self.fieldNames = {}
         self.fieldNames[Qt.UserRole] = QByteArray(("modelData").encode("utf-8"))
-        for i in range(len(record)):
-            self.fieldNames[Qt.UserRole + i + 1] = QByteArray(("sql_" + record.fieldName(i)).encode("utf-8"))
+        self.roleColumns = {Qt.UserRole: 0}
+        for i, field in enumerate(fields):
+            self.fieldNames[Qt.UserRole + i + 1] = QByteArray(("sql_" + field).encode("utf-8"))
+            self.roleColumns[Qt.UserRole + i + 1] = i
 
     def roleNames(self):
         return self.fieldNames
 
-    def rowCount(self, parent):
-        return len(self.results)
+    def rowCount(self, parent=QModelIndex()):
+        return self.offset + len(self.results) + self.after
 
     def reset(self):
         self.beginResetModel()
         self.fieldNames = {}
-        self.results = []
+        self.roleColumns = {}
+        self.results = Rows()
+        self.offset = 0
+        self.after = 0
         self.endResetModel()
 
+    def clearWindow(self):
+        if self.offset or self.after:
+            self.beginRemoveRows(QModelIndex(), 0, self.rowCount()-1)
+            self.results, self.offset, self.after = Rows(), 0, 0
+            self.endRemoveRows()
+
     @pyqtSlot()
     def forceReset(self):
         self.beginResetModel()
@@ -5,8 +5,8 @@ from PyQt5.QtGui import QImage, QDesktopServices, QDrag
 
 import sql
 import os
-import PIL.Image
 import misc
+import parameters
 import glob
 import shutil
 import time
@@ -40,6 +40,10 @@ class Populater(QObject):
         self.all_descs = []
     
     def populateCache(self):
+        self.all_images = self.gui.modelFiles((".png", ".jpg", ".jpeg"))
+        self.all_descs = self.gui.modelFiles((".txt", ".csv", ".civitai.info"))
+        if self.all_images != None and self.all_descs != None:
+            return
         self.all_images = []
         self.all_descs = []
         folder = self.gui.modelDirectory()
@@ -100,13 +104,11 @@ class Populater(QObject):
             for file in files:
                 if not os.path.exists(file):
                     continue
-                try:
-                    with PIL.Image.open(file) as img:
-                        preview = file
-                        w,h = img.size
-                        break
-                except:
-                    pass
+                header = parameters.getImageHeader(file)
+                if header:
+                    preview = file
+                    w,h = header[0], header[1]
+                    break
             else:
                 continue
             break
@@ -218,21 +218,15 @@ Rectangle {
                 id: filesSql
 
                 //debug: true
+                keyColumn: "file"
+                pageKey: "idx"
+                pageSize: 256
 
                 query: {
                     if(root.asleep) {
                         return ""
                     }
-                    var pre_str = "SELECT file, width, height, parameters FROM images WHERE folder = '" + folder.currentValue + "'"
-                    var post_str = " ORDER BY idx DESC;"
-
-                    var searches = search.text.split(";")
-                    var search_str = ""
-                    for(var i = 0; i < searches.length; i++) {
-                        search_str += " AND parameters LIKE '%" + searches[i].trim() + "%'"
-                    }
-
-                    return pre_str + search_str + post_str;
+                    return GALLERY.searchQuery(folder.currentValue || "", search.text)
                  }
                 
                 property bool reset: false
@@ -243,6 +237,7 @@ Rectangle {
                 }
 
                 onQueryChanged: {
+                    GALLERY.cancelPrefetch()
                     filesSql.refresh()
                     reset = true
                 }
@@ -262,6 +257,14 @@ Rectangle {
                 }
             }
 
+            onPrefetchRange: {
+                if(direction >= 0) {
+                    GALLERY.prefetch(filesSql.getLoadedRange(last + 1, last + count, "file"))
+                } else {
+                    GALLERY.prefetch(filesSql.getLoadedRange(first - count, first - 1, "file").reverse())
+                }
+            }
+
             onContextMenu: {
                 let files = gallery.getSelectedFiles()
                 if(files.length > 0) {
@@ -50,12 +50,7 @@ GridView {
     }
 
     function getIndex(file) {
-        for(var i = 0; i < thumbView.model.length; i++) {
-            if(thumbView.model.get(i)["file"] == file) {
-                return i
-            }
-        }
-        return -1
+        return thumbView.model.indexOf("file", file)
     }
 
     function getSelectedFiles() {
@@ -98,11 +93,16 @@ GridView {
     }
 
     function addSelectionRange(start, end) {
-        let delta = end < start ? -1 : 1
-        for(let i = start; i != end; i += delta) {
-            addToSelected(i)
+        var files = thumbView.model.getRange(Math.min(start, end), Math.max(start, end), "file")
+        if(end < start) {
+            files.reverse()
         }
-        addToSelected(end)
+        var adding = {}
+        for(let i = 0; i < files.length; i++) {
+            adding[files[i]] = true
+        }
+        selected = selected.filter(id => !adding[id]).concat(files)
+        selectedLength = selected.length
     }
 
     function clearSelection() {
@@ -179,6 +179,25 @@ GridView {
 
     signal contextMenu()
     signal drag()
+    signal prefetchRange(int first, int last, int direction, int count)
+
+    property int prefetchRows: 4
+    property int prefetchRow: -1
+    property real prefetchY: 0
+
+    onContentYChanged: {
+        let columns = Math.max(Math.round(thumbView.width/thumbView.cellWidth), 1)
+        let row = Math.floor(Math.max(contentY, 0)/cellHeight)
+        if(row == prefetchRow) {
+            return
+        }
+        let direction = contentY >= prefetchY ? 1 : -1
+        let first = row * columns
+        let last = Math.ceil((Math.max(contentY, 0) + height)/cellHeight) * columns - 1
+        prefetchRow = row
+        prefetchY = contentY
+        thumbView.prefetchRange(first, last, direction, prefetchRows * columns)
+    }
 
     interactive: false
     boundsBehavior: Flickable.StopAtBounds
@@ -1,8 +1,11 @@
-import PIL.Image
 import shutil
 import os
 import send2trash
 import glob
+import sqlite3
+import collections
+import concurrent.futures
+import datetime
 
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, pyqtProperty, QObject, QThread, QUrl, QMimeData, Qt
 from PyQt5.QtSql import QSqlQuery
@@ -12,8 +15,147 @@ from PyQt5.QtWidgets import QApplication
 import sql
 import filesystem
 import parameters
+import thumbnails
 import time
 
+GALLERY_INDEX_VERSION = 1
+GALLERY_INDEX_MIGRATIONS = {
+    1: ["CREATE TABLE IF NOT EXISTS images(file TEXT PRIMARY KEY, mtime INTEGER, fsize INTEGER, width INTEGER, height INTEGER, parameters TEXT);"]
+}
+
+SEARCH_COLUMNS = {"model": "model", "sampler": "sampler", "seed": "seed", "steps": "steps", "cfg": "scale", "width": "width", "height": "height", "size": "size", "date": "mtime"}
+SEARCH_ORDERS = {"newest": "idx DESC", "oldest": "idx ASC", "seed": "seed ASC", "steps": "steps ASC", "cfg": "scale ASC", "model": "model ASC", "sampler": "sampler ASC", "size": "pixels DESC", "date": "mtime DESC"}
+
+def get_number(value, cast):
+    try:
+        return cast(value)
+    except Exception:
+        return None
+
+def get_date(value, end=False):
+    try:
+        date = datetime.datetime.strptime(value.strip(), "%Y-%m-%d")
+    except Exception:
+        return None
+    if end:
+        date += datetime.timedelta(days=1)
+    return int(date.timestamp())
+
+def get_range(column, value, cast):
+    start, _, end = value.partition("..")
+    if not _:
+        end = start
+    clauses = []
+    if cast == get_date:
+        start, end = get_date(start), get_date(end, True)
+        if start != None:
+            clauses += [f"{column} >= {start}"]
+        if end != None:
+            clauses += [f"{column} < {end}"]
+    else:
+        start, end = get_number(start, cast), get_number(end, cast)
+        if start != None:
+            clauses += [f"{column} >= {start}"]
+        if end != None:
+            clauses += [f"{column} <= {end}"]
+    return clauses
+
+def get_search_filters(text):
+    remaining, clauses, order = [], [], None
+    for term in text.split(";"):
+        key, _, value = term.partition(":")
+        key, value = key.strip().lower(), value.strip()
+        if not _ or not value or not (key in SEARCH_COLUMNS or key == "sort"):
+            remaining += [term]
+            continue
+        if key == "sort":
+            order = SEARCH_ORDERS.get(value.lower(), order)
+        elif key in {"model", "sampler"}:
+            value = value.replace("'", "''")
+            clauses += [f"{key} = '{value}'"] if key == "sampler" else [f"model >= '{value}' AND model < '{value}\uffff'"]
+        elif key == "size":
+            w, _, h = value.lower().partition("x")
+            clauses += get_range("width", w, int) + get_range("height", h, int)
+        elif key == "date":
+            clauses += get_range("mtime", value, get_date)
+        else:
+            clauses += get_range(SEARCH_COLUMNS[key], value, float if key == "cfg" else int)
+    return ";".join(remaining), clauses, order
+
+class GalleryIndex():
+    def __init__(self, file):
+        self.file = file
+        self.conn = None
+        if not file:
+            return
+        try:
+            conn = sqlite3.connect(file)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self.migrate(conn)
+            self.conn = conn
+        except Exception:
+            pass
+
+    def migrate(self, conn):
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+        if version > GALLERY_INDEX_VERSION:
+            conn.execute("DROP TABLE IF EXISTS images;")
+            version = 0
+        for v in range(version+1, GALLERY_INDEX_VERSION+1):
+            for statement in GALLERY_INDEX_MIGRATIONS[v]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {v};")
+            conn.commit()
+
+    def get(self, stats):
+        if not self.conn or not stats:
+            return {}
+        found = {}
+        files = list(stats.keys())
+        try:
+            for i in range(0, len(files), 512):
+                chunk = files[i:i+512]
+                rows = self.conn.execute(f"SELECT file, mtime, fsize, width, height, parameters FROM images WHERE file IN ({','.join('?'*len(chunk))});", chunk).fetchall()
+                for f, m, s, w, h, p in rows:
+                    if stats[f] == (m, s):
+                        found[f] = (w, h, p)
+        except Exception as e:
+            print("GALLERY INDEX", e)
+        return found
+
+    def put(self, rows):
+        if not self.conn or not rows:
+            return
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO images(file, mtime, fsize, width, height, parameters) VALUES (?, ?, ?, ?, ?, ?);", [(f, s[0], s[1], w, h, p) for f, s, w, h, p in rows])
+            self.conn.commit()
+        except Exception as e:
+            print("GALLERY INDEX", e)
+
+    def remove(self, files):
+        if not self.conn or not files:
+            return
+        try:
+            self.conn.executemany("DELETE FROM images WHERE file = ?;", [(f,) for f in files])
+            self.conn.commit()
+        except Exception as e:
+            print("GALLERY INDEX", e)
+
+    def prune(self, folder, files):
+        if not self.conn:
+            return
+        folder = os.path.abspath(folder)
+        prefix = os.path.join(folder, "")
+        files = {os.path.normcase(os.path.abspath(f)) for f in files}
+        try:
+            rows = self.conn.execute("SELECT file FROM images WHERE file >= ? AND file < ?;", (prefix, prefix + "\uffff")).fetchall()
+        except Exception as e:
+            print("GALLERY INDEX", e)
+            return
+        folder = os.path.normcase(folder)
+        self.remove([f for f, in rows if os.path.normcase(os.path.dirname(f)) == folder and not os.path.normcase(f) in files])
+
 class Populater(QObject):
     forceReload = pyqtSignal(str)
     stop = pyqtSignal(str)
@@ -35,25 +177,42 @@ class Populater(QObject):
             os.makedirs(os.path.join(self.output, s), exist_ok=True)
 
         self.conn = None
+        self.index = None
         self.watcher = gui.watcher
         self.folders = set()
         self.working = set()
         self.fresh = set()
         self.initial = True
 
+        self.executor = concurrent.futures.ThreadPoolExecutor(max(1, self.gui._config._values.get("gallery_workers") or 1))
+        self.pending = collections.deque()
+        self.inflight = 4
+
+        self.searchIds = {}
+        self.searchCounter = 0
+
     @pyqtSlot()
     def started(self):
         self.conn = sql.Connection(self)
         self.conn.connect()
         self.conn.doQuery("CREATE TABLE folders(folder TEXT UNIQUE, name TEXT UNIQUE, idx INTEGER UNIQUE);")
-        self.conn.doQuery("CREATE TABLE images(file TEXT UNIQUE, folder TEXT, parameters TEXT, idx INTEGER, width INTEGER, height INTEGER, CONSTRAINT unq UNIQUE (folder, idx));")
+        self.conn.doQuery("CREATE TABLE images(file TEXT UNIQUE, folder TEXT, parameters TEXT, idx INTEGER, width INTEGER, height INTEGER, pixels INTEGER, model TEXT COLLATE NOCASE, sampler TEXT COLLATE NOCASE, seed INTEGER, steps INTEGER, scale REAL, mtime INTEGER, CONSTRAINT unq UNIQUE (folder, idx));")
+        for columns in ["model", "sampler", "seed", "width, height", "pixels", "mtime"]:
+            self.conn.doQuery(f"CREATE INDEX images_{columns.replace(', ', '_')} ON images(folder, {columns});")
+        self.conn.doQuery("CREATE VIRTUAL TABLE images_search USING fts5(file UNINDEXED, prompt, negative, settings, tokenize = \"unicode61 tokenchars '_'\");")
         self.conn.enableNotifications("folders")
         self.conn.disableNotifications("images")
 
+        self.index = GalleryIndex(self.gui._config._values.get("gallery_index"))
+
         self.prepareFolders()
 
         self.watcher.finished.connect(self.onFinished)
+        self.watcher.updated.connect(self.onUpdated)
         self.watcher.folder_changed.connect(self.onResult)
+        self.watcher.files_added.connect(self.onResult)
+        self.watcher.files_modified.connect(self.onResult)
+        self.watcher.files_removed.connect(self.onRemoved)
         self.watcher.parent_changed.connect(self.onParentChanged)
 
     def prepareFolders(self):
@@ -102,6 +261,17 @@ class Populater(QObject):
     def onFinished(self, folder, total):
         if not folder in self.folders:
             return
+        self.flush(True)
+
+        q = QSqlQuery(self.conn.db)
+        q.prepare("SELECT file FROM images WHERE folder == :folder AND idx >= :total;")
+        q.bindValue(":folder", folder)
+        q.bindValue(":total", total)
+        self.conn.doQuery(q)
+        stale = []
+        while q.next():
+            stale += [q.value(0)]
+        self.removeSearch(stale)
 
         q = QSqlQuery(self.conn.db)
         q.prepare("DELETE FROM images WHERE folder == :folder AND idx >= :total;")
@@ -109,6 +279,16 @@ class Populater(QObject):
         q.bindValue(":total", total)
         self.conn.doQuery(q)
 
+        if folder in self.fresh:
+            q = QSqlQuery(self.conn.db)
+            q.prepare("SELECT file FROM images WHERE folder == :folder;")
+            q.bindValue(":folder", folder)
+            self.conn.doQuery(q)
+            files = set()
+            while q.next():
+                files.add(q.value(0))
+            self.index.prune(folder, files)
+
         self.working.discard(folder)
         self.fresh.discard(folder)
         if len(self.working) == 0 and len(self.fresh) == 0:
@@ -119,6 +299,60 @@ class Populater(QObject):
             self.initial = False
             self.resumeFolders()
 
+    @pyqtSlot(str, int)
+    def onUpdated(self, folder, total):
+        if not folder in self.folders:
+            return
+        self.flush(True)
+
+        self.working.discard(folder)
+        if len(self.working) == 0 and len(self.fresh) == 0:
+            self.gui.setTabWorking(self.name, False)
+
+    @pyqtSlot(str, list)
+    def onRemoved(self, folder, files):
+        if not folder in self.folders:
+            return
+        self.flush(True)
+
+        self.removeSearch(files)
+
+        q = QSqlQuery(self.conn.db)
+        q.prepare("DELETE FROM images WHERE file == :file;")
+        q.bindValue(":file", files)
+        q.execBatch()
+
+        self.index.remove(files)
+
+    def removeSearch(self, files):
+        ids = [self.searchIds.pop(f) for f in files if f in self.searchIds]
+        if not ids:
+            return
+        q = QSqlQuery(self.conn.db)
+        q.prepare("DELETE FROM images_search WHERE rowid == :id;")
+        q.bindValue(":id", ids)
+        q.execBatch()
+
+    def updateSearch(self, files, params):
+        self.removeSearch(files)
+        ids, prompts, negatives, settings = [], [], [], []
+        for f, p in zip(files, params):
+            self.searchCounter += 1
+            self.searchIds[f] = self.searchCounter
+            ids += [self.searchCounter]
+            fields = parameters.getSearchFields(p)
+            prompts += [fields[0]]
+            negatives += [fields[1]]
+            settings += [fields[2]]
+        q = QSqlQuery(self.conn.db)
+        q.prepare("INSERT INTO images_search(rowid, file, prompt, negative, settings) VALUES (:id, :file, :prompt, :negative, :settings);")
+        q.bindValue(":id", ids)
+        q.bindValue(":file", files)
+        q.bindValue(":prompt", prompts)
+        q.bindValue(":negative", negatives)
+        q.bindValue(":settings", settings)
+        q.execBatch()
+
     @pyqtSlot(str, list, list)
     def onResult(self, folder, files, idxs):
         if not folder in self.folders:
@@ -128,39 +362,75 @@ class Populater(QObject):
             self.gui.setTabWorking(self.name, True)
         self.working.add(folder)
 
-        data = zip(files, idxs)
-        
-        files, folders, idxs, widths, heights, parameters = [], [], [], [], [], []
+        data = [(f, i) for f, i in zip(files, idxs) if f.split(".")[-1] in {"png"}]
+        stats = {f: thumbnails.get_stat(f) for f, _ in data}
+        cached = self.index.get(stats)
+        reads = {f: self.executor.submit(parameters.getImageHeader, f) for f, _ in data if not f in cached}
+
+        self.pending.append((folder, data, stats, cached, reads))
+        self.flush(False)
+
+    def flush(self, block):
+        while self.pending:
+            reads = self.pending[0][4]
+            if not block and len(self.pending) <= self.inflight and not all(r.done() for r in reads.values()):
+                break
+            self.insert(*self.pending.popleft())
+
+    def insert(self, folder, data, stats, cached, reads):
+        fresh = []
+        files, folders, idxs, widths, heights, pixels, params, parsed = [], [], [], [], [], [], [], []
+        models, samplers, seeds, steps, scales, mtimes = [], [], [], [], [], []
         for f, i in data:
-            if not f.split(".")[-1] in {"png"}:
-                continue
-            w, h, p = 0, 0, ""
-            try:
-                with PIL.Image.open(f) as img:
-                    if "parameters" in img.info:
-                        p = img.info["parameters"]
-                    w, h = img.size
-            except Exception:
-                continue
-            if w == 0 or h == 0:
-                continue
+            if f in cached:
+                w, h, p = cached[f]
+            else:
+                header = reads[f].result()
+                if not header:
+                    continue
+                w, h, p = header[0], header[1], header[2].get("parameters", "")
+                if w == 0 or h == 0:
+                    continue
+                if stats[f]:
+                    fresh += [(f, stats[f], w, h, p)]
             files += [f]
             folders += [folder]
             idxs += [i]
             widths += [w]
             heights += [h]
-            parameters += [p.replace("'", "''")]
+            pixels += [w * h]
+            params += [p.replace("'", "''")]
+
+            json = parameters.parseParameters(p)
+            parsed += [json]
+            models += [json.get("model", None)]
+            samplers += [json.get("sampler", None)]
+            seeds += [get_number(json.get("seed", None), int)]
+            steps += [get_number(json.get("steps", None), int)]
+            scales += [get_number(json.get("scale", None), float)]
+            mtimes += [stats[f][0] // 1000000000 if stats[f] else None]
+
+        self.updateSearch(files, parsed)
 
         q = QSqlQuery(self.conn.db)
-        q.prepare(f"INSERT OR REPLACE INTO images(file, folder, parameters, idx, width, height) VALUES (:file, :folder, :param, :idx, :width, :height);")
+        q.prepare(f"INSERT OR REPLACE INTO images(file, folder, parameters, idx, width, height, pixels, model, sampler, seed, steps, scale, mtime) VALUES (:file, :folder, :param, :idx, :width, :height, :pixels, :model, :sampler, :seed, :steps, :scale, :mtime);")
         q.bindValue(":file", files)
         q.bindValue(":folder", folders)
-        q.bindValue(":param", parameters)
+        q.bindValue(":param", params)
         q.bindValue(":idx", idxs)
         q.bindValue(":width", widths)
         q.bindValue(":height", heights)
+        q.bindValue(":pixels", pixels)
+        q.bindValue(":model", models)
+        q.bindValue(":sampler", samplers)
+        q.bindValue(":seed", seeds)
+        q.bindValue(":steps", steps)
+        q.bindValue(":scale", scales)
+        q.bindValue(":mtime", mtimes)
         q.execBatch()
 
+        self.index.put(fresh)
+
         if self.initial:
             self.forceReload.emit(folder)
 
@@ -206,6 +476,16 @@ class Gallery(QObject):
 
         self.deleters = []
     
+    @pyqtSlot(list)
+    def prefetch(self, files):
+        if thumbnails.ThumbnailStorage.instance:
+            thumbnails.ThumbnailStorage.instance.prefetch(files, self)
+
+    @pyqtSlot()
+    def cancelPrefetch(self):
+        if thumbnails.ThumbnailStorage.instance:
+            thumbnails.ThumbnailStorage.instance.cancelPrefetch(self)
+
     @pyqtSlot(list)
     def doOpenFiles(self, files):
         files = [os.path.abspath(f) for f in files if os.path.exists(f)]
@@ -276,6 +556,18 @@ class Gallery(QObject):
     def stop(self):
         self.populaterThread.quit()
         self.populaterThread.wait()
+        self.populater.executor.shutdown(wait=False, cancel_futures=True)
+
+    @pyqtSlot(str, str, result=str)
+    def searchQuery(self, folder, text):
+        text, clauses, order = get_search_filters(text)
+        folder = folder.replace("'", "''")
+        match = parameters.getSearchMatch(text).replace("'", "''")
+        where = "".join(f" AND {c}" for c in clauses)
+        if not match:
+            return f"SELECT file, width, height, parameters, idx FROM images WHERE folder = '{folder}'{where} ORDER BY {order or 'idx DESC'};"
+        order = order or "bm25(images_search, 0.0, 10.0, 2.0, 1.0), idx DESC"
+        return f"SELECT images.file AS file, width, height, parameters, idx FROM images_search JOIN images ON images.file = images_search.file WHERE images_search MATCH '{match}' AND folder = '{folder}'{where} ORDER BY {order};"
 
     @pyqtProperty(int, notify=update)
     def cellSize(self):
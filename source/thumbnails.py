@@ -1,6 +1,10 @@
 import io
 import os
+import sqlite3
 import threading
+import collections
+import heapq
+import itertools
 
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QObject, QMutex, QThreadPool, QUrl, QByteArray, QThread, QSize
 from PyQt5.QtSql import QSqlQuery
@@ -10,95 +14,523 @@ from PyQt5.QtGui import QImage
 import PIL.Image
 
 import filesystem
-import sql
 
-def get_thumbnail(file, size, quality):
+THUMBNAIL_MODES = {
+    "fast": (PIL.Image.Resampling.BILINEAR, 1.5),
+    "balanced": (PIL.Image.Resampling.LANCZOS, 2.0)
+}
+
+def get_thumbnail_image(file, size, mode="quality"):
+    with PIL.Image.open(file) as image:
+        if mode in THUMBNAIL_MODES:
+            resample, margin = THUMBNAIL_MODES[mode]
+            image.draft('RGB', size)
+            if not image.mode in {"RGB", "RGBA", "L"}:
+                image = image.convert('RGB')
+            factor = int(max(image.width / size[0], image.height / size[1]) / margin)
+            if factor > 1:
+                image = image.reduce(factor)
+            image.thumbnail(size, resample, reducing_gap=None)
+            image = image.convert('RGB')
+        else:
+            image = image.convert('RGB')
+            image.thumbnail(size, PIL.Image.Resampling.LANCZOS)
+    return image
+
+def encode_thumbnail(image, quality):
     blob = io.BytesIO()
-    image = PIL.Image.open(file).convert('RGB')
-    image.thumbnail(size, PIL.Image.Resampling.LANCZOS)
     image.save(blob, "JPEG", quality=quality)
     return blob.getvalue()
 
-class ThumbnailStorage(QObject):
-    instance = None
-    def __init__(self, size, big_size, quality, parent=None):
-        super().__init__(parent)
-        self.cache = {size: {}, big_size: {}}
+def get_thumbnail(file, size, quality, mode="quality"):
+    return encode_thumbnail(get_thumbnail_image(file, size, mode), quality)
+
+def to_qimage(image):
+    data = image.tobytes()
+    return QImage(data, image.width, image.height, image.width * 3, QImage.Format_RGB888).copy()
+
+def from_qimage(image):
+    image = image.convertToFormat(QImage.Format_RGB888)
+    data = image.constBits().asstring(image.sizeInBytes())
+    return PIL.Image.frombuffer("RGB", (image.width(), image.height()), data, "raw", "RGB", image.bytesPerLine(), 1)
+
+def downscale_thumbnail(thumbnail, size):
+    thumbnail = thumbnail.copy()
+    thumbnail.thumbnail(size, PIL.Image.Resampling.LANCZOS)
+    return thumbnail
+
+def get_key(file):
+    return os.path.normcase(os.path.abspath(file))
+
+def get_stat(file):
+    try:
+        stat = os.stat(file)
+        return stat.st_mtime_ns, stat.st_size
+    except Exception:
+        return None
+
+class ThumbnailStore():
+    def __init__(self, file):
+        self.file = file
+        self.guard = threading.Lock()
+        self.conn = None
+        try:
+            conn = sqlite3.connect(file, check_same_thread=False)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("CREATE TABLE IF NOT EXISTS thumbnails(file TEXT, width INTEGER, height INTEGER, quality INTEGER, mtime INTEGER, fsize INTEGER, data BLOB, PRIMARY KEY (file, width, height, quality));")
+            conn.commit()
+            self.conn = conn
+        except Exception:
+            pass
+
+    def get(self, file, size, quality, stat=None):
+        if not self.conn:
+            return None
+        stat = stat or get_stat(file)
+        if not stat:
+            return None
+        with self.guard:
+            row = self.conn.execute("SELECT mtime, fsize, data FROM thumbnails WHERE file = ? AND width = ? AND height = ? AND quality = ?;", (get_key(file), size[0], size[1], quality)).fetchone()
+        if not row or (row[0], row[1]) != stat:
+            return None
+        return row[2]
+
+    def put(self, file, size, quality, blob, stat=None):
+        if not self.conn:
+            return
+        stat = stat or get_stat(file)
+        if not stat:
+            return
+        with self.guard:
+            self.conn.execute("INSERT OR REPLACE INTO thumbnails(file, width, height, quality, mtime, fsize, data) VALUES (?, ?, ?, ?, ?, ?, ?);", (get_key(file), size[0], size[1], quality, stat[0], stat[1], blob))
+            self.conn.commit()
+
+    def remove(self, files):
+        if not self.conn:
+            return
+        with self.guard:
+            self.conn.executemany("DELETE FROM thumbnails WHERE file = ?;", [(get_key(f),) for f in files])
+            self.conn.commit()
+
+    def compact(self):
+        if not self.conn:
+            return
+        with self.guard:
+            rows = self.conn.execute("SELECT DISTINCT file, mtime, fsize FROM thumbnails;").fetchall()
+        stale = [(f, m, s) for f, m, s in rows if get_stat(f) != (m, s)]
+        with self.guard:
+            self.conn.executemany("DELETE FROM thumbnails WHERE file = ? AND mtime = ? AND fsize = ?;", stale)
+            self.conn.commit()
+            incremental = self.conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
+        free = None
+        while stale and incremental:
+            with self.guard:
+                remaining = self.conn.execute("PRAGMA freelist_count;").fetchone()[0]
+                if not remaining or remaining == free:
+                    break
+                self.conn.execute("PRAGMA incremental_vacuum(256);").fetchall()
+                self.conn.commit()
+            free = remaining
+
+    def revalidate(self, folder, stats):
+        if not self.conn:
+            return
+        prefix = os.path.join(folder, "")
+        with self.guard:
+            rows = self.conn.execute("SELECT DISTINCT file, mtime, fsize FROM thumbnails WHERE file >= ? AND file < ?;", (prefix, prefix + "\uffff")).fetchall()
+        stale = []
+        for f, m, s in rows:
+            if os.path.dirname(f) == folder and stats.get(f, None) != (m, s):
+                stale += [(f, m, s)]
+        if stale:
+            with self.guard:
+                self.conn.executemany("DELETE FROM thumbnails WHERE file = ? AND mtime = ? AND fsize = ?;", stale)
+                self.conn.commit()
+
+class ThumbnailCache():
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = collections.OrderedDict()
+        self.sources = {}
         self.guard = QMutex()
-        ThumbnailStorage.instance = self
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-        self.async_provider = AsyncThumbnailProvider(size, quality)
-        self.sync_provider = SyncThumbnailProvider(size, quality)
-        self.big_provider = AsyncThumbnailProvider(big_size, quality)
+    def get(self, file):
+        self.guard.lock()
+        image = self.entries.get(file, None)
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(file)
+        self.guard.unlock()
+        return image
 
-    def get(self, file, size):
+    def peek(self, file):
         self.guard.lock()
-        image = self.cache[size].get(file, None)
+        image = self.entries.get(file, None)
+        if image is not None:
+            self.entries.move_to_end(file)
         self.guard.unlock()
         return image
-    def put(self, file, image, size):
+
+    def put(self, file, image, source=None):
         self.guard.lock()
-        self.cache[size][file] = image
+        if file in self.entries:
+            self.bytes -= self.entries.pop(file).sizeInBytes()
+        self.entries[file] = image
+        self.sources[file] = source
+        self.bytes += image.sizeInBytes()
+        while self.budget and self.bytes > self.budget and len(self.entries) > 1:
+            evicted, image = self.entries.popitem(last=False)
+            self.bytes -= image.sizeInBytes()
+            self.sources.pop(evicted, None)
+            self.evictions += 1
         self.guard.unlock()
-    def has(self, file, size):
+
+    def has(self, file):
         self.guard.lock()
-        out = file in self.cache[size]
+        out = file in self.entries
         self.guard.unlock()
         return out
-    def remove(self, file):
+
+    def remove(self, files):
         self.guard.lock()
-        for size in self.cache:
-            if file in self.cache[size]:
-                del self.cache[size][file]
+        for file in files:
+            if file in self.entries:
+                self.bytes -= self.entries.pop(file).sizeInBytes()
+                self.sources.pop(file, None)
         self.guard.unlock()
-    def removeAll(self, files):
+
+    def revalidate(self, folder, stats):
         self.guard.lock()
-        for size in self.cache:
-            for file in files:
-                if file in self.cache[size]:
-                    del self.cache[size][file]
+        stale = []
+        for file, source in self.sources.items():
+            path = get_key(file)
+            if os.path.dirname(path) == folder and stats.get(path, None) != source:
+                stale += [file]
         self.guard.unlock()
+        self.remove(stale)
+        return stale
 
-class ThumbnailResponseRunnableSignals(QObject):
-    done = pyqtSignal('QImage')
+    def stats(self):
+        self.guard.lock()
+        out = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self.bytes, "budget": self.budget, "count": len(self.entries)}
+        self.guard.unlock()
+        return out
+
+class ThumbnailTask():
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+        self.cancelled = False
+
+    def run(self):
+        try:
+            self.function(*self.args)
+        except Exception as e:
+            print("THUMBNAIL TASK", e)
+
+class ThumbnailPool():
+    def __init__(self, workers):
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
 
-class ThumbnailResponseRunnable(threading.Thread):
+    def submit(self, runnable, priority=0):
+        with self.condition:
+            heapq.heappush(self.queue, (priority, -next(self.counter), runnable))
+            self.condition.notify()
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                _, _, runnable = heapq.heappop(self.queue)
+            if runnable.cancelled:
+                continue
+            try:
+                runnable.run()
+            except Exception as e:
+                print("THUMBNAIL POOL", e)
+
+class ThumbnailFlight():
     def __init__(self, file, size, quality):
-        super().__init__()
+        self.file = file
         self.size = size
         self.quality = quality
-        self.file = file
-        self.signals = ThumbnailResponseRunnableSignals()
-        self.image = None
-        self.daemon = True
-    
+        self.runnables = []
+        self.owner = None
+        self.started = False
+        self.cancelled = False
+        self.event = threading.Event()
+        self.result = None
+
     def run(self):
+        ThumbnailStorage.instance.fly(self)
+
+class ThumbnailStorage(QObject):
+    instance = None
+    def __init__(self, size, big_size, quality, store="", budgets={}, workers=4, mode="quality", parent=None):
+        super().__init__(parent)
+        self.cache = {size: ThumbnailCache(budgets.get(size, 0)), big_size: ThumbnailCache(budgets.get(big_size, 0))}
+        self.size = size
+        self.quality = quality
+        self.mode = mode
+        self.pool = ThumbnailPool(workers)
+        self.inflight = {}
+        self.inflightGuard = QMutex()
+        self.coalesced = 0
+        self.derived = 0
+        ThumbnailStorage.instance = self
+
+        self.store = None
+        if store:
+            self.store = ThumbnailStore(store)
+            threading.Thread(target=self.store.compact, daemon=True).start()
+
+        self.async_provider = AsyncThumbnailProvider(size, quality)
+        self.sync_provider = SyncThumbnailProvider(size, quality)
+        self.big_provider = AsyncThumbnailProvider(big_size, quality)
+
+    def get(self, file, size):
+        return self.cache[size].get(file)
+    def load(self, file, size, count=False):
+        image = self.get(file, size) if count else self.cache[size].peek(file)
+        if image is None and self.store:
+            source = get_stat(file)
+            blob = self.store.get(file, size, self.quality, source)
+            if blob:
+                image = QImage.fromData(QByteArray(blob), "JPG")
+                self.cache[size].put(file, image, source)
+        return image
+    def put(self, file, image, size, source=None):
+        self.cache[size].put(file, image, source)
+    def larger(self, size):
+        return sorted([s for s in self.cache if s != size and s[0] >= size[0] and s[1] >= size[1]], key=lambda s: s[0]*s[1])
+    def smaller(self, size):
+        return [s for s in self.cache if s != size and s[0] <= size[0] and s[1] <= size[1]]
+    def derive(self, file, size):
+        for larger in self.larger(size):
+            image = self.load(file, larger)
+            if image is not None:
+                self.derived += 1
+                return downscale_thumbnail(from_qimage(image), size)
+        return None
+    def spill(self, file, thumbnail, size, source=None):
+        if not self.store:
+            return
         try:
-            blob = get_thumbnail(self.file, self.size, self.quality)
-            ThumbnailStorage.instance.put(self.file, blob, self.size)
-            self.image = QImage.fromData(QByteArray(blob), "JPG")
+            self.store.put(file, size, self.quality, encode_thumbnail(thumbnail, self.quality), source)
         except Exception as e:
-            #print(e)
-            self.image = QImage()
+            print("THUMBNAIL STORE", e)
+    def has(self, file, size):
+        return self.cache[size].has(file)
+    def remove(self, file):
+        self.removeAll([file])
+    def removeAll(self, files):
+        for size in self.cache:
+            self.cache[size].remove(files)
+        if self.store:
+            self.store.remove(files)
+
+    def invalidate(self, files):
+        for size in self.cache:
+            self.cache[size].remove(files)
+        if self.store:
+            self.pool.submit(ThumbnailTask(self.store.remove, files), 2)
+
+    @pyqtSlot(str, list, list)
+    def onFilesModified(self, folder, files, idxs):
+        self.invalidate(files)
+
+    @pyqtSlot(str, list)
+    def onFilesRemoved(self, folder, files):
+        self.invalidate(files)
+
+    @pyqtSlot(str, object)
+    def revalidate(self, folder, stats):
+        self.pool.submit(ThumbnailTask(self.revalidateFolder, folder, stats), 2)
 
-        self.signals.done.emit(self.image)
+    def revalidateFolder(self, folder, stats):
+        folder = get_key(folder)
+        stats = {get_key(f): s for f, s in stats.items()}
+        for size in self.cache:
+            self.cache[size].revalidate(folder, stats)
+        if self.store:
+            self.store.revalidate(folder, stats)
+
+    def request(self, runnable):
+        key = (runnable.file, runnable.size)
+        self.inflightGuard.lock()
+        flight = self.inflight.get(key, None)
+        if flight:
+            self.coalesced += 1
+            flight.runnables += [runnable]
+            promote = flight.owner != None and not flight.started
+            flight.owner = None
+            self.inflightGuard.unlock()
+            if promote:
+                self.pool.submit(flight)
+            return
+        flight = ThumbnailFlight(runnable.file, runnable.size, runnable.quality)
+        flight.runnables += [runnable]
+        self.inflight[key] = flight
+        self.inflightGuard.unlock()
+        self.pool.submit(flight)
+
+    def cancel(self, runnable):
+        key = (runnable.file, runnable.size)
+        self.inflightGuard.lock()
+        runnable.cancelled = True
+        flight = self.inflight.get(key, None)
+        if flight and not flight.started and all(r.cancelled for r in flight.runnables):
+            flight.cancelled = True
+            del self.inflight[key]
+        self.inflightGuard.unlock()
+
+    def prefetch(self, files, owner, size=None):
+        size = size or self.size
+        self.cancelPrefetch(owner)
+        flights = []
+        self.inflightGuard.lock()
+        for file in reversed(files):
+            file = QUrl.fromLocalFile(file).toLocalFile()
+            key = (file, size)
+            if key in self.inflight or self.cache[size].has(file):
+                continue
+            flight = ThumbnailFlight(file, size, self.quality)
+            flight.owner = owner
+            self.inflight[key] = flight
+            flights += [flight]
+        self.inflightGuard.unlock()
+        for flight in flights:
+            self.pool.submit(flight, 1)
+
+    def cancelPrefetch(self, owner):
+        self.inflightGuard.lock()
+        for key, flight in list(self.inflight.items()):
+            if flight.owner == owner and not flight.started and not flight.runnables:
+                flight.cancelled = True
+                del self.inflight[key]
+        self.inflightGuard.unlock()
+
+    def generate(self, file, size, quality):
+        key = (file, size)
+        self.inflightGuard.lock()
+        flight = self.inflight.get(key, None)
+        if flight:
+            self.coalesced += 1
+        else:
+            flight = ThumbnailFlight(file, size, quality)
+            self.inflight[key] = flight
+        self.inflightGuard.unlock()
+        self.fly(flight)
+        flight.event.wait()
+        return flight.result
+
+    def fly(self, flight):
+        self.inflightGuard.lock()
+        started = flight.started
+        flight.started = True
+        self.inflightGuard.unlock()
+        if started:
+            return
+
+        image, thumbnail, pyramid, source = None, None, {}, None
+        try:
+            image = self.load(flight.file, flight.size)
+            if image is None:
+                source = get_stat(flight.file)
+                thumbnail = self.derive(flight.file, flight.size)
+                if not thumbnail:
+                    thumbnail = get_thumbnail_image(flight.file, flight.size, self.mode)
+                    for smaller in self.smaller(flight.size):
+                        if not self.has(flight.file, smaller):
+                            pyramid[smaller] = downscale_thumbnail(thumbnail, smaller)
+                            self.put(flight.file, to_qimage(pyramid[smaller]), smaller, source)
+                image = to_qimage(thumbnail)
+                self.put(flight.file, image, flight.size, source)
+        except Exception:
+            image = None
+
+        self.inflightGuard.lock()
+        key = (flight.file, flight.size)
+        if self.inflight.get(key, None) == flight:
+            del self.inflight[key]
+        runnables = flight.runnables
+        self.inflightGuard.unlock()
+
+        flight.result = image
+        flight.event.set()
+
+        for runnable in runnables:
+            if not runnable.cancelled:
+                runnable.signals.done.emit(image if image is not None else QImage())
+
+        if thumbnail:
+            self.spill(flight.file, thumbnail, flight.size, source)
+        for smaller, derived in pyramid.items():
+            self.spill(flight.file, derived, smaller, source)
+
+    @pyqtSlot(result='QVariant')
+    def stats(self):
+        out = {f"{w}x{h}": self.cache[(w,h)].stats() for w, h in self.cache}
+        out["coalesced"] = self.coalesced
+        out["derived"] = self.derived
+        return out
+
+class ThumbnailResponseRunnableSignals(QObject):
+    done = pyqtSignal('QImage')
+
+class ThumbnailResponseRunnable():
+    def __init__(self, file, size, quality):
+        self.size = size
+        self.quality = quality
+        self.file = file
+        self.signals = ThumbnailResponseRunnableSignals()
+        self.cancelled = False
 
 class ThumbnailResponse(QQuickImageResponse):
     def __init__(self, file, size, quality):
         super().__init__()
         file = QUrl.fromLocalFile(file).toLocalFile()
-        blob = ThumbnailStorage.instance.get(file, size)
-        if not blob:
+        self.runnable = None
+        self.done = False
+        image = ThumbnailStorage.instance.get(file, size)
+        if image is None:
             self.runnable = ThumbnailResponseRunnable(file, size, quality)
             self.runnable.signals.done.connect(self.onDone)
-            self.runnable.start()
+            ThumbnailStorage.instance.request(self.runnable)
         else:
-            self.image = QImage.fromData(QByteArray(blob), "JPG")
+            self.image = image
+            self.done = True
             self.finished.emit()       
     
     @pyqtSlot('QImage')
     def onDone(self, image):
+        if self.done:
+            return
         self.image = QImage(image)
+        self.done = True
+        self.finished.emit()
+
+    def cancel(self):
+        if self.done:
+            return
+        if self.runnable:
+            ThumbnailStorage.instance.cancel(self.runnable)
+        self.image = QImage()
+        self.done = True
         self.finished.emit()
     
     def textureFactory(self):
@@ -124,12 +556,10 @@ class SyncThumbnailProvider(QQuickImageProvider):
     def requestImage(self, path, size):
         file = QUrl.fromPercentEncoding(path.encode('utf-8'))
         try:
-            blob = ThumbnailStorage.instance.get(file, self.size)
-            if not blob:
-                blob = get_thumbnail(file, self.size, self.quality)
-                ThumbnailStorage.instance.put(file, blob, self.size)
+            image = ThumbnailStorage.instance.load(file, self.size, True)
+            if image is None:
+                image = ThumbnailStorage.instance.generate(file, self.size, self.quality)
 
-            image = QImage.fromData(QByteArray(blob), "JPG")
             return image, image.size()
         except Exception as e:
             #print(e)
@@ -17,34 +17,38 @@ class Wildcards(QObject):
     def reload(self):
         wildcards = {}
         sources = {}
-        folder = os.path.join(self.gui.modelDirectory(), "WILDCARD")
-        for ext in ["*.txt", "*.csv"]:
-            for file in glob.glob(os.path.join(folder, os.path.join("**", ext)), recursive=True):
-                try:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        lines = []
-                        for l in [l.strip() for l in f.readlines() if l.strip()]:
-                            if l[0] == '#':
-                                continue
-                            if ',' in l:
-                                a, b = l.rsplit(',',1)
-                                try:
-                                    b = int(b)
-                                    l = a
-                                except:
-                                    pass
-                            lines += [l]
-
-                        if not lines:
+        folder = self.gui.wildcardDirectory()
+        files = self.gui.watcher.treeFiles(folder, (".txt", ".csv"))
+        if files == None:
+            files = []
+            for ext in ["*.txt", "*.csv"]:
+                files += glob.glob(os.path.join(folder, os.path.join("**", ext)), recursive=True)
+        for file in sorted(files, key=lambda f: f.lower().endswith(".csv")):
+            try:
+                with open(file, 'r', encoding='utf-8') as f:
+                    lines = []
+                    for l in [l.strip() for l in f.readlines() if l.strip()]:
+                        if l[0] == '#':
                             continue
-                        path = os.path.relpath(file, folder)
-                        name = path.rsplit('.',1)[0].replace(os.path.sep, "/")
-                        sources[name] = path
-                        wildcards[name] = lines
-                except Exception as e:
-                    with open("crash.log", "a", encoding='utf-8') as f:
-                        f.write(f"WILDCARD {datetime.datetime.now()}\nLOADING {file} FAILED: {str(e)}\n")
-                    continue
+                        if ',' in l:
+                            a, b = l.rsplit(',',1)
+                            try:
+                                b = int(b)
+                                l = a
+                            except:
+                                pass
+                        lines += [l]
+
+                    if not lines:
+                        continue
+                    path = os.path.relpath(file, folder)
+                    name = path.rsplit('.',1)[0].replace(os.path.sep, "/")
+                    sources[name] = path
+                    wildcards[name] = lines
+            except Exception as e:
+                with open("crash.log", "a", encoding='utf-8') as f:
+                    f.write(f"WILDCARD {datetime.datetime.now()}\nLOADING {file} FAILED: {str(e)}\n")
+                continue
         self._wildcards = wildcards
         self._sources = sources
         self.updated.emit()
\ No newline at end of file